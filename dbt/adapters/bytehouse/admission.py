@@ -0,0 +1,94 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, Hashable
+
+_comment_re = re.compile(r'^\s*(/\*.*?\*/\s*|--[^\n]*\n\s*)*', re.DOTALL)
+_ctas_re = re.compile(
+    r'^create\s+(or\s+replace\s+)?(temporary\s+)?table\b.*?\bas\s*\(?\s*(select|with)\b',
+    re.IGNORECASE | re.DOTALL,
+)
+_insert_select_re = re.compile(r'^insert\s+into\b.*?\b(select|with)\b', re.IGNORECASE | re.DOTALL)
+_mutation_re = re.compile(
+    r'^(alter\s+table\b.*?\b(update|delete)\b|delete\s+from\b)', re.IGNORECASE | re.DOTALL
+)
+
+
+def is_heavy_statement(sql: str) -> bool:
+    """
+    Whether a statement makes the warehouse scan and write data: CREATE TABLE ... AS SELECT,
+    INSERT ... SELECT and mutations. Metadata queries, DDL and INSERT ... VALUES are light.
+    """
+    sql = _comment_re.sub('', sql, count=1)
+    return bool(_ctas_re.match(sql) or _insert_select_re.match(sql) or _mutation_re.match(sql))
+
+
+class WeightedSemaphore:
+    """
+    Semaphore where each holder takes `weight` of `capacity` units. Waiters are admitted in
+    arrival order, so a heavy statement is not starved by a stream of lighter ones.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._used = 0
+        self._waiting: deque = deque()
+        self._cond = threading.Condition()
+
+    def acquire(self, weight: int) -> float:
+        """
+        Block until `weight` units are free and take them. Returns the seconds spent waiting.
+        """
+        weight = self._clamp(weight)
+        pre = time.time()
+        ticket = object()
+        with self._cond:
+            self._waiting.append(ticket)
+            while self._waiting[0] is not ticket or self._used + weight > self.capacity:
+                self._cond.wait()
+            self._waiting.popleft()
+            self._used += weight
+            self._cond.notify_all()
+        return time.time() - pre
+
+    def release(self, weight: int) -> None:
+        with self._cond:
+            self._used -= self._clamp(weight)
+            self._cond.notify_all()
+
+    def _clamp(self, weight: int) -> int:
+        # A statement heavier than the whole capacity still runs, alone
+        return min(max(1, weight), self.capacity)
+
+
+_semaphores: Dict[Hashable, WeightedSemaphore] = {}
+_semaphores_lock = threading.Lock()
+
+
+def get_admission(key: Hashable, capacity: int) -> WeightedSemaphore:
+    """
+    Return the process-wide semaphore admitting heavy statements to one warehouse.
+    """
+    with _semaphores_lock:
+        if key not in _semaphores:
+            _semaphores[key] = WeightedSemaphore(capacity)
+        return _semaphores[key]
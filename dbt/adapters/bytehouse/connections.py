@@ -16,22 +16,59 @@
    limitations under the License.
 """
 
+import dataclasses
+import queue
 import re
+import threading
 import time
 from contextlib import contextmanager
-from typing import Any, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import agate
 import dbt.exceptions
 from dbt.adapters.sql import SQLConnectionManager
-from dbt.contracts.connection import Connection
+from dbt.contracts.connection import AdapterResponse, Connection, LazyHandle
 from dbt.events import AdapterLogger
-
-from dbt.adapters.bytehouse.dbclient import BhRetryableException, get_db_client
+from dbt.events.functions import get_invocation_id
+
+from dbt.adapters.bytehouse.admission import get_admission, is_heavy_statement
+from dbt.adapters.bytehouse.costs import query_id_prefix
+from dbt.adapters.bytehouse.dbclient import (
+    BhClientWrapper,
+    BhRetryableException,
+    acquire_db_client,
+    get_client_pool,
+    release_db_client,
+)
+from dbt.adapters.bytehouse.metrics import metrics, statement_kind
+from dbt.adapters.bytehouse.results import columns_to_result, table_from_result
+from dbt.adapters.bytehouse.seeds import CSV_DATA_PLACEHOLDER, quote_string
 
 logger = AdapterLogger('bytehouse')
 retryable_exceptions = [BhRetryableException]
 ddl_re = re.compile(r'^\s*(CREATE|DROP|ALTER)\s', re.IGNORECASE)
+# Server default of max_query_size, statements carrying long literal lists may exceed it
+DEFAULT_MAX_QUERY_SIZE = 262144
+
+
+def query_size_settings(sql: str) -> Dict[str, Any]:
+    if len(sql) < DEFAULT_MAX_QUERY_SIZE:
+        return {}
+    return {'max_query_size': len(sql) + 1}
+
+
+@dataclasses.dataclass
+class ByteHouseAdapterResponse(AdapterResponse):
+    """
+    Server statistics of a statement, as the driver received them with its progress packets.
+    """
+
+    rows_read: Optional[int] = None
+    bytes_read: Optional[int] = None
+    written_rows: Optional[int] = None
+    written_bytes: Optional[int] = None
+    result_rows: Optional[int] = None
+    elapsed: Optional[float] = None
 
 
 class ByteHouseConnectionManager(SQLConnectionManager):
@@ -41,6 +78,78 @@ class ByteHouseConnectionManager(SQLConnectionManager):
 
     TYPE = 'bytehouse'
 
+    def __init__(self, profile):
+        super().__init__(profile)
+        # Warehouse and query weight of the node each thread runs, see set_node_routing
+        self._routing = threading.local()
+        if profile.credentials.connection_pool:
+            # Size the pool for one connection per dbt thread
+            get_client_pool(profile.credentials, profile.threads)
+
+    def set_node_routing(self, warehouse: Optional[str] = None, weight: int = 1) -> None:
+        """
+        Bind the connections this thread uses from now on to `warehouse`, or to the warehouse
+        of the profile when it is None, and weigh their heavy statements with `weight`.
+        """
+        self._routing.warehouse = warehouse
+        self._routing.weight = weight
+
+    @contextmanager
+    def admission(self, sql: str, conn: Connection):
+        """
+        Hold a share of the heavy_query_slots of the connection's warehouse while a heavy
+        statement runs. Other statements are let through without waiting.
+        """
+        credentials = self.get_credentials(conn.credentials)
+        if not credentials.heavy_query_slots or not is_heavy_statement(sql):
+            yield
+            return
+        weight = getattr(self._routing, 'weight', 1)
+        key = (
+            credentials.host,
+            credentials.port,
+            credentials.region,
+            credentials.account,
+            credentials.user,
+            credentials.warehouse,
+        )
+        semaphore = get_admission(key, credentials.heavy_query_slots)
+        waited = semaphore.acquire(weight)
+        metrics.observe('admission_wait', waited)
+        logger.debug(
+            f'Admitted to warehouse {credentials.warehouse} with weight {weight} after '
+            f'{waited:.2f} seconds in queue'
+        )
+        try:
+            yield
+        finally:
+            semaphore.release(weight)
+
+    @staticmethod
+    def _client(conn: Connection) -> BhClientWrapper:
+        """
+        The client of a connection, tagging the query ids of its statements with the
+        invocation and the node the connection is named after.
+        """
+        client = conn.handle
+        client.query_id_prefix = query_id_prefix(get_invocation_id(), conn.name)
+        return client
+
+    def set_connection_name(self, name: Optional[str] = None) -> Connection:
+        conn = super().set_connection_name(name)
+        credentials = self.profile.credentials
+        warehouse = getattr(self._routing, 'warehouse', None) or credentials.warehouse
+        if conn.credentials.warehouse != warehouse:
+            if conn.state == 'open':
+                logger.debug(f'Moving connection \'{conn.name}\' to warehouse {warehouse}')
+                self.close(conn)
+                conn.handle = LazyHandle(self.open)
+            conn.credentials = dataclasses.replace(credentials, warehouse=warehouse)
+            if credentials.connection_pool:
+                # Pools are kept per warehouse, each sized like the default one
+                get_client_pool(conn.credentials, self.profile.threads)
+        return conn
+
     @contextmanager
     def exception_handler(self, sql):
         try:
@@ -58,8 +167,15 @@ class ByteHouseConnectionManager(SQLConnectionManager):
             return connection
         credentials = cls.get_credentials(connection.credentials)
 
+        attempts = 0
+
         def connect():
-            return get_db_client(credentials)
+            nonlocal attempts
+            attempts += 1
+            if attempts > 1:
+                metrics.increment('connection_retries')
+            with metrics.timed('connection_open'):
+                return acquire_db_client(credentials)
 
         return cls.retry_connection(
             connection,
@@ -72,19 +188,38 @@ class ByteHouseConnectionManager(SQLConnectionManager):
     def cancel(self, connection):
         connection_name = connection.name
         logger.debug('Cancelling query \'{}\'', connection_name)
-        connection.handle.close()
+        credentials = self.get_credentials(connection.credentials)
+        try:
+            if not connection.handle.cancel(credentials.cancel_timeout):
+                logger.debug(
+                    f'Query of \'{connection_name}\' still running on the server after '
+                    f'{credentials.cancel_timeout} seconds'
+                )
+        except Exception as ex:
+            logger.debug(f'Could not kill the query of \'{connection_name}\' on the server: {ex}')
         logger.debug('Cancel query \'{}\'', connection_name)
 
     def release(self):
-        pass  # There is no "release" type functionality in the existing ByteHouse connectors
+        if self.profile.credentials.connection_pool:
+            # Closing hands the client back to the pool
+            super().release()
 
     @classmethod
-    def get_table_from_response(cls, response, column_names) -> agate.Table:
+    def _close_handle(cls, connection):
+        credentials = cls.get_credentials(connection.credentials)
+        logger.debug(f'Releasing connection \'{connection.name}\'')
+        release_db_client(credentials, connection.handle)
+
+    @classmethod
+    def get_table_from_response(cls, response, column_names, column_types=None) -> agate.Table:
         """
         Build agate table from response.
         :param response: ByteHouse query result
         :param column_names: Table column names
+        :param column_types: ByteHouse column types, when known no type is inferred
         """
+        if column_types is not None:
+            return table_from_result(response, column_names, column_types)
         data = []
         for row in response:
             data.append(dict(zip(column_names, row)))
@@ -92,32 +227,119 @@ class ByteHouseConnectionManager(SQLConnectionManager):
         return dbt.clients.agate_helper.table_from_data_flat(data, column_names)
 
     def execute(
-        self, sql: str, auto_begin: bool = False, fetch: bool = False
-    ) -> Tuple[str, agate.Table]:
+        self,
+        sql: str,
+        auto_begin: bool = False,
+        fetch: bool = False,
+        result_format: Optional[str] = None,
+    ) -> Tuple[AdapterResponse, Any]:
+        """
+        Run a statement. Fetched results are an agate table, or with result_format one of
+        RESULT_FORMATS read column by column from the driver.
+        """
         # Don't try to fetch result of clustered DDL responses, we don't know what to do with them
         if fetch and ddl_re.match(sql):
             fetch = False
 
         sql = self._add_query_comment(sql)
         conn = self.get_thread_connection()
-        client = conn.handle
+        client = self._client(conn)
 
         with self.exception_handler(sql):
             logger.debug(f'On {conn.name}: {sql}...')
             pre = time.time()
-            if fetch:
-                query_result = client.query(sql)
-            else:
-                query_result = client.command(sql)
-            status = self.get_status(client)
-            logger.debug(f'SQL status: {status} in {(time.time() - pre):.2f} seconds')
-            if fetch:
+            settings = query_size_settings(sql)
+            with self.admission(sql, conn), metrics.timed('statement', kind=statement_kind(sql)):
+                if fetch and result_format is not None:
+                    query_result = client.query(sql, columnar=True, settings=settings)
+                elif fetch:
+                    query_result = client.query(sql, settings=settings)
+                else:
+                    query_result = client.command(sql, settings=settings)
+            response = self.get_response(client)
+            logger.debug(f'SQL status: {response} in {(time.time() - pre):.2f} seconds')
+            if fetch and result_format is not None:
+                table = columns_to_result(
+                    query_result.result_set,
+                    query_result.column_names,
+                    query_result.column_types,
+                    result_format,
+                )
+            elif fetch:
                 table = self.get_table_from_response(
-                    query_result.result_set, query_result.column_names
+                    query_result.result_set, query_result.column_names, query_result.column_types
                 )
             else:
                 table = dbt.clients.agate_helper.empty_table()
-            return status, table
+            return response, table
+
+    def execute_stream(
+        self,
+        sql: str,
+        block_rows: int,
+        max_rows: int = 0,
+        max_bytes: int = 0,
+        result_format: Optional[str] = None,
+    ) -> Iterator[Any]:
+        """
+        Run a query and yield its result in blocks of at most block_rows rows, each an agate
+        table or, with result_format, one of RESULT_FORMATS. Only the current block is held in
+        memory. A result of more than max_rows rows, or of more than max_bytes bytes as counted
+        by the server, fails with a RuntimeException. The admission slot and statement timing
+        are held until the generator is exhausted or closed.
+        """
+        sql = self._add_query_comment(sql)
+        conn = self.get_thread_connection()
+        client = self._client(conn)
+        settings: Dict[str, Any] = {}
+        if max_rows:
+            settings.update(max_result_rows=max_rows, result_overflow_mode='throw')
+        if max_bytes:
+            settings.update(max_result_bytes=max_bytes, result_overflow_mode='throw')
+
+        limits = ' / '.join(
+            limit
+            for limit in (max_rows and f'{max_rows} rows', max_bytes and f'{max_bytes} bytes')
+            if limit
+        )
+
+        def exceeded() -> dbt.exceptions.RuntimeException:
+            return dbt.exceptions.RuntimeException(
+                f'Query result exceeds the limit of {limits}, narrow the query or raise '
+                f'result_max_rows / result_max_bytes'
+            )
+
+        with self.exception_handler(sql):
+            logger.debug(f'On {conn.name}: {sql}... (streaming)')
+            pre = time.time()
+            total = 0
+            with self.admission(sql, conn), metrics.timed('statement', kind=statement_kind(sql)):
+                stream = None
+                try:
+                    stream = client.stream(sql, block_rows, settings=settings)
+                    for rows in stream.blocks:
+                        total += len(rows)
+                        if max_rows and total > max_rows:
+                            raise exceeded()
+                        if result_format is None:
+                            yield table_from_result(rows, stream.column_names, stream.column_types)
+                        else:
+                            yield columns_to_result(
+                                list(zip(*rows)),
+                                stream.column_names,
+                                stream.column_types,
+                                result_format,
+                            )
+                except dbt.exceptions.DatabaseException as exp:
+                    if 'Limit for result exceeded' in str(exp):
+                        raise exceeded() from exp
+                    raise
+                finally:
+                    if stream is not None:
+                        stream.blocks.close()
+            logger.debug(
+                f'SQL status: OK, streamed {total} rows in {(time.time() - pre):.2f} seconds'
+            )
 
     def add_query(
         self,
@@ -128,13 +350,14 @@ class ByteHouseConnectionManager(SQLConnectionManager):
     ) -> Tuple[Connection, Any]:
         sql = self._add_query_comment(sql)
         conn = self.get_thread_connection()
-        client = conn.handle
+        client = self._client(conn)
 
         with self.exception_handler(sql):
             logger.debug(f'On {conn.name}: {sql}...')
 
             pre = time.time()
-            client.command(sql)
+            with self.admission(sql, conn), metrics.timed('statement', kind=statement_kind(sql)):
+                client.command(sql, settings=query_size_settings(sql))
 
             status = self.get_status(client)
 
@@ -142,6 +365,148 @@ class ByteHouseConnectionManager(SQLConnectionManager):
 
             return conn, None
 
+    def fetch_rows(self, sql: str) -> List[tuple]:
+        """
+        Run a statement and return its rows as tuples, without building an agate table.
+        """
+        sql = self._add_query_comment(sql)
+        conn = self.get_thread_connection()
+        client = self._client(conn)
+
+        with self.exception_handler(sql):
+            logger.debug(f'On {conn.name}: {sql[:512]}...')
+
+            pre = time.time()
+            with metrics.timed('statement', kind=statement_kind(sql)):
+                result = client.query(sql, settings=query_size_settings(sql))
+
+            status = self.get_status(client)
+
+            logger.debug(f'SQL status: {status} in {(time.time() - pre):0.2f} seconds')
+
+            return result.result_set
+
+    def insert_columns(self, sql: str, columns: List[list]) -> Tuple[Connection, Any]:
+        """
+        Run an INSERT ... VALUES statement with its data sent as typed column blocks.
+        """
+        sql = self._add_query_comment(sql)
+        conn = self.get_thread_connection()
+        client = self._client(conn)
+
+        with self.exception_handler(sql):
+            logger.debug(f'On {conn.name}: {sql}...')
+
+            pre = time.time()
+            with metrics.timed('statement', kind='insert'):
+                client.insert(sql, columns)
+
+            status = self.get_status(client)
+
+            logger.debug(f'SQL status: {status} in {(time.time() - pre):0.2f} seconds')
+
+            return conn, None
+
+    def insert_column_chunks(self, sql: str, chunks: Iterable[List[list]], workers: int) -> None:
+        """
+        Insert column blocks produced lazily by `chunks`, spread over `workers` connections. At
+        most two chunks per worker are held in memory at any time.
+        """
+        if workers <= 1:
+            for chunk in chunks:
+                self.insert_columns(sql, chunk)
+            return
+
+        sql = self._add_query_comment(sql)
+        conn = self.get_thread_connection()
+        credentials = self.get_credentials(conn.credentials)
+        prefix = query_id_prefix(get_invocation_id(), conn.name)
+        pending: queue.Queue = queue.Queue(maxsize=workers)
+        errors: List[Exception] = []
+        done = object()
+
+        def work():
+            try:
+                client = acquire_db_client(credentials)
+                client.query_id_prefix = prefix
+            except Exception as exp:
+                errors.append(exp)
+                client = None
+            try:
+                while True:
+                    chunk = pending.get()
+                    if chunk is done:
+                        return
+                    if client is None or errors:
+                        continue
+                    pre = time.time()
+                    try:
+                        with metrics.timed('statement', kind='insert'):
+                            client.insert(sql, chunk)
+                    except Exception as exp:
+                        errors.append(exp)
+                        continue
+                    logger.debug(
+                        f'Inserted {len(chunk[0]) if chunk else 0} rows in '
+                        f'{(time.time() - pre):0.2f} seconds'
+                    )
+            finally:
+                if client is not None:
+                    release_db_client(credentials, client)
+
+        with self.exception_handler(sql):
+            logger.debug(f'On {conn.name}: {sql}... ({workers} workers)')
+            pre = time.time()
+            threads = [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+            for thread in threads:
+                thread.start()
+            try:
+                for chunk in chunks:
+                    if errors:
+                        break
+                    pending.put(chunk)
+            finally:
+                for _ in threads:
+                    pending.put(done)
+                for thread in threads:
+                    thread.join()
+            if errors:
+                raise errors[0]
+            logger.debug(f'SQL status: OK in {(time.time() - pre):0.2f} seconds')
+
+    def insert_csv_chunks(self, sql: str, chunks: Iterable[str]) -> bool:
+        """
+        Insert raw CSV text chunk by chunk with `sql`, a statement reading the chunk from
+        CSV_DATA_PLACEHOLDER, leaving all parsing to the server. Returns False without inserting
+        anything when the server rejects the first chunk, so callers can fall back to typed
+        inserts.
+        """
+        sql = self._add_query_comment(sql)
+        conn = self.get_thread_connection()
+        client = self._client(conn)
+        settings = {'date_time_input_format': 'best_effort'}
+
+        with self.exception_handler(sql):
+            logger.debug(f'On {conn.name}: {sql}...')
+            pre = time.time()
+            total = 0
+            for chunk in chunks:
+                statement = sql.replace(CSV_DATA_PLACEHOLDER, quote_string(chunk), 1)
+                settings['max_query_size'] = len(statement) + 1
+                try:
+                    with metrics.timed('statement', kind='insert'):
+                        client.fetch(statement, settings=settings)
+                except dbt.exceptions.DatabaseException as exp:
+                    if total:
+                        raise
+                    logger.debug(f'Server side CSV parsing is not available: {exp}')
+                    return False
+                total += len(chunk)
+            logger.debug(
+                f'SQL status: OK, sent {total} bytes of CSV in {(time.time() - pre):0.2f} seconds'
+            )
+            return True
+
     @classmethod
     def get_credentials(cls, credentials):
         """
@@ -157,8 +522,14 @@ class ByteHouseConnectionManager(SQLConnectionManager):
         return 'OK'
 
     @classmethod
-    def get_response(cls, _):
-        return 'OK'
+    def get_response(cls, client) -> ByteHouseAdapterResponse:
+        """
+        Returns the server statistics of the last statement run by the client
+        """
+        statistics = client.query_statistics()
+        rows_affected = statistics.get('written_rows') or statistics.get('result_rows')
+        response = ByteHouseAdapterResponse(_message='OK', rows_affected=rows_affected)
+        return dataclasses.replace(response, **statistics)
 
     def begin(self):
         pass
@@ -0,0 +1,103 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import csv
+import json
+import os
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+COST_REPORT_FILE = 'bytehouse_costs'
+COST_FIELDS = (
+    'statements',
+    'elapsed_seconds',
+    'cpu_seconds',
+    'read_rows',
+    'read_bytes',
+    'written_rows',
+    'written_bytes',
+    'peak_memory',
+)
+# Columns of the query log summed per node, in the order QUERY_LOG_SQL selects them
+COUNTER_FIELDS = ('read_rows', 'read_bytes', 'written_rows', 'written_bytes')
+# Statements that finished, with or without an error, of one dbt invocation
+QUERY_LOG_SQL = (
+    'SELECT query_id, query_duration_ms, read_rows, read_bytes, written_rows, written_bytes, '
+    'memory_usage, {cpu} FROM {query_log} '
+    "WHERE type IN ('QueryFinish', 'ExceptionWhileProcessing') AND event_date >= yesterday() "
+    "AND startsWith(query_id, '{prefix}')"
+)
+CPU_MICROSECONDS = "ProfileEvents['UserTimeMicroseconds'] + ProfileEvents['SystemTimeMicroseconds']"
+
+
+def query_id_prefix(invocation_id: str, node_id: Optional[str]) -> str:
+    """
+    Prefix of the query ids of the statements a node runs, so they can be found in the
+    server's query log. Node unique ids never contain a slash.
+    """
+    return f'{invocation_id}/{node_id or ""}/'
+
+
+def query_log_sql(invocation_id: str, query_log: str, with_cpu: bool = True) -> str:
+    return QUERY_LOG_SQL.format(
+        cpu=CPU_MICROSECONDS if with_cpu else 'NULL',
+        query_log=query_log,
+        prefix=f'{invocation_id}/',
+    )
+
+
+def aggregate_costs(rows: Iterable[Sequence[Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Sum the query log rows returned by query_log_sql per node. Peak memory is the highest
+    of the node's statements, cpu_seconds is None when the server did not report it.
+    """
+    costs: Dict[str, Dict[str, Any]] = {}
+    for query_id, duration_ms, *counters, memory, cpu in rows:
+        node_id = query_id.split('/', 1)[1].rsplit('/', 1)[0]
+        node = costs.setdefault(node_id, dict.fromkeys(COST_FIELDS, 0))
+        node['statements'] += 1
+        node['elapsed_seconds'] = round(node['elapsed_seconds'] + duration_ms / 1000, 3)
+        for field, value in zip(COUNTER_FIELDS, counters):
+            node[field] += value
+        node['peak_memory'] = max(node['peak_memory'], memory)
+        if cpu is None or node['cpu_seconds'] is None:
+            node['cpu_seconds'] = None
+        else:
+            node['cpu_seconds'] = round(node['cpu_seconds'] + cpu / 1e6, 3)
+    return costs
+
+
+def write_cost_report(directory: str, invocation_id: str, costs: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Write the costs as JSON and as a CSV table with the most expensive nodes first, both
+    named COST_REPORT_FILE in `directory`. Returns the path of the JSON file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{COST_REPORT_FILE}.json')
+    with open(path, 'w') as f:
+        json.dump({'invocation_id': invocation_id, 'nodes': costs}, f, indent=2, sort_keys=True)
+    ranked = sorted(
+        costs.items(),
+        key=lambda item: (item[1]['cpu_seconds'] or 0, item[1]['elapsed_seconds']),
+        reverse=True,
+    )
+    with open(os.path.join(directory, f'{COST_REPORT_FILE}.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(('node',) + COST_FIELDS)
+        for node_id, node in ranked:
+            writer.writerow([node_id] + [node[field] for field in COST_FIELDS])
+    return path
@@ -41,6 +41,7 @@ class ByteHouseCredentials(Credentials):
     schema: Optional[str] = 'default'
     password: str = ''
     warehouse: Optional[str] = None
+    warehouses: Optional[Dict[str, str]] = None
     cluster: Optional[str] = None
     database_engine: Optional[str] = None
     cluster_mode: bool = False
@@ -53,6 +54,19 @@ class ByteHouseCredentials(Credentials):
     compression: str = ''
     check_exchange: bool = True
     custom_settings: Optional[Dict[str, Any]] = None
+    metadata_cache: bool = False
+    metadata_threads: int = 4
+    metadata_cache_ttl: int = 0
+    result_max_rows: int = 0
+    result_max_bytes: int = 0
+    connection_pool: bool = False
+    pool_max_size: int = 0
+    pool_idle_timeout: int = 300
+    warehouse_prewarm: bool = False
+    warehouse_keepalive: int = 0
+    heavy_query_slots: int = 0
+    cancel_timeout: int = 10
+    metrics_sink: Optional[str] = None
 
     @property
     def type(self):
@@ -94,4 +108,18 @@ class ByteHouseCredentials(Credentials):
             'compression',
             'check_exchange',
             'custom_settings',
+            'metadata_cache',
+            'metadata_threads',
+            'metadata_cache_ttl',
+            'result_max_rows',
+            'result_max_bytes',
+            'connection_pool',
+            'pool_max_size',
+            'pool_idle_timeout',
+            'warehouse_prewarm',
+            'warehouse_keepalive',
+            'warehouses',
+            'heavy_query_slots',
+            'cancel_timeout',
+            'metrics_sink',
         )
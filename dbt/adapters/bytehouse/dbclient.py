@@ -16,12 +16,23 @@
    limitations under the License.
 """
 
+import atexit
+import hashlib
+import threading
+import time
 from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from dbt.events import AdapterLogger
 from dbt.exceptions import FailedToConnectException
 
 from dbt.adapters.bytehouse.credentials import ByteHouseCredentials
+from dbt.adapters.bytehouse.metadata import (
+    MetaColumn,
+    get_metadata_catalog,
+    get_relation_type_cache,
+)
+from dbt.adapters.bytehouse.metrics import metrics
 
 logger = AdapterLogger('bytehouse')
 
@@ -40,26 +51,248 @@ def get_db_client(credentials: ByteHouseCredentials):
         )
 
 
+class ClientPool:
+    """
+    Idle clients of one set of credentials, shared by every connection of the process. Each
+    client has already done its handshake, database and warehouse setup.
+    """
+
+    def __init__(self, credentials: ByteHouseCredentials, size: int):
+        self._credentials = credentials
+        self._max_size = max(1, credentials.pool_max_size or size)
+        self._idle_timeout = credentials.pool_idle_timeout
+        self._prewarm_size = size
+        self._idle: List[Tuple[float, 'BhClientWrapper']] = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> 'BhClientWrapper':
+        """
+        Hand out an idle client that answers a ping, or connect a new one.
+        """
+        while True:
+            with self._lock:
+                expired = self._evict_expired()
+                entry = self._idle.pop() if self._idle else None
+                prewarm, self._prewarm_size = self._prewarm_size, 0
+            for client in expired:
+                client.close()
+            if entry is None:
+                client = get_db_client(self._credentials)
+                if prewarm > 1:
+                    self._prewarm(prewarm - 1)
+                return client
+            if entry[1].is_healthy():
+                return entry[1]
+            logger.debug('Discarding a pooled connection that failed its health check')
+            entry[1].close()
+
+    def release(self, client: 'BhClientWrapper') -> None:
+        with self._lock:
+            expired = self._evict_expired()
+            keep = not client.discarded and len(self._idle) < self._max_size
+            if keep:
+                self._idle.append((time.time(), client))
+        for idle_client in expired:
+            idle_client.close()
+        if not keep:
+            client.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for _, client in idle:
+            client.close()
+
+    def _evict_expired(self) -> List['BhClientWrapper']:
+        deadline = time.time() - self._idle_timeout
+        expired = [client for released, client in self._idle if released < deadline]
+        self._idle = [entry for entry in self._idle if entry[0] >= deadline]
+        return expired
+
+    def _prewarm(self, count: int) -> None:
+        def connect():
+            try:
+                self.release(get_db_client(self._credentials))
+            except Exception as ex:
+                logger.debug(f'Could not pre-warm a pooled connection: {ex}')
+
+        logger.debug(f'Pre-warming {count} pooled connections')
+        for _ in range(count):
+            threading.Thread(target=connect, daemon=True).start()
+
+
+_pools: Dict[Tuple, ClientPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_client_pool(credentials: ByteHouseCredentials, size: int = 1) -> ClientPool:
+    """
+    Return the process-wide client pool of the credentials. `size` is the number of
+    connections it is pre-warmed to, and its maximum size unless pool_max_size is set.
+    """
+    # Only a digest of the password is kept, so it never shows in the key
+    key = (
+        credentials.host,
+        credentials.port,
+        credentials.region,
+        credentials.account,
+        credentials.user,
+        credentials.schema,
+        credentials.warehouse,
+        hashlib.sha256(credentials.password.encode('utf-8')).hexdigest(),
+    )
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ClientPool(credentials, size)
+        return _pools[key]
+
+
+def acquire_db_client(credentials: ByteHouseCredentials) -> 'BhClientWrapper':
+    if not credentials.connection_pool:
+        return get_db_client(credentials)
+    return get_client_pool(credentials).acquire()
+
+
+def release_db_client(credentials: ByteHouseCredentials, client: 'BhClientWrapper') -> None:
+    if not credentials.connection_pool:
+        client.close()
+        return
+    get_client_pool(credentials).release(client)
+
+
+# Databases known to exist and warehouses known to be running, for the whole process
+_prepared: Set[Tuple] = set()
+_prepared_lock = threading.Lock()
+
+
+def _prepared_key(credentials: ByteHouseCredentials, kind: str, name: str) -> Tuple:
+    return (
+        credentials.host,
+        credentials.port,
+        credentials.region,
+        credentials.account,
+        credentials.user,
+        kind,
+        name,
+    )
+
+
+def is_prepared(credentials: ByteHouseCredentials, kind: str, name: str) -> bool:
+    with _prepared_lock:
+        return _prepared_key(credentials, kind, name) in _prepared
+
+
+def mark_prepared(credentials: ByteHouseCredentials, kind: str, name: str) -> None:
+    with _prepared_lock:
+        _prepared.add(_prepared_key(credentials, kind, name))
+
+
+def forget_prepared(credentials: ByteHouseCredentials, kind: str, name: str) -> None:
+    with _prepared_lock:
+        _prepared.discard(_prepared_key(credentials, kind, name))
+
+
+_warmups: Dict[Tuple, threading.Event] = {}
+_stopping = threading.Event()
+
+
+def prewarm_warehouse(credentials: ByteHouseCredentials) -> None:
+    """
+    Check and resume the warehouse of the credentials in a background thread, once per
+    process, so that the resume overlaps with parsing and compiling. With warehouse_keepalive
+    the thread then touches the warehouse at that interval until the process exits.
+    """
+    try:
+        from dbt.adapters.bytehouse.nativeclient import BhNativeClient
+    except ImportError:
+        return
+    key = _prepared_key(credentials, 'warehouse', credentials.warehouse)
+    with _prepared_lock:
+        if key in _prepared or key in _warmups:
+            return
+        done = _warmups[key] = threading.Event()
+
+    def run():
+        pre = time.time()
+        try:
+            client = BhNativeClient.warm_warehouse(credentials)
+        except Exception as ex:
+            logger.debug(f'Could not pre-warm warehouse {credentials.warehouse}: {ex}')
+            return
+        finally:
+            done.set()
+        mark_prepared(credentials, 'warehouse', credentials.warehouse)
+        logger.debug(f'Warehouse {credentials.warehouse} ready in {time.time() - pre:.2f} seconds')
+        try:
+            while credentials.warehouse_keepalive > 0 and not _stopping.wait(
+                credentials.warehouse_keepalive
+            ):
+                BhNativeClient.touch_warehouse(client, credentials.warehouse)
+        except Exception as ex:
+            logger.debug(f'Stopped keeping warehouse {credentials.warehouse} alive: {ex}')
+        finally:
+            client.disconnect()
+
+    threading.Thread(target=run, name='bytehouse-warehouse', daemon=True).start()
+
+
+def wait_for_warehouse(credentials: ByteHouseCredentials) -> None:
+    """
+    Wait for the background warm-up of the warehouse, if one is running.
+    """
+    with _prepared_lock:
+        done = _warmups.get(_prepared_key(credentials, 'warehouse', credentials.warehouse))
+    if done is not None and not done.is_set():
+        pre = time.time()
+        done.wait()
+        logger.debug(f'Waited {time.time() - pre:.2f} seconds for the warehouse to resume')
+
+
+@atexit.register
+def close_client_pools() -> None:
+    _stopping.set()
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
 class BhRetryableException(Exception):
     pass
 
 
 class BhClientWrapper(ABC):
     def __init__(self, credentials: ByteHouseCredentials):
+        # Set once the client is cancelled, it is then never reused nor closed again
+        self.discarded = False
         self.database = credentials.schema
+        self._credentials = credentials
+        self.metadata = get_metadata_catalog(credentials) if credentials.metadata_cache else None
+        self._metadata_threads = max(1, credentials.metadata_threads)
+        self.relation_types = get_relation_type_cache(credentials)
         self._conn_settings = credentials.custom_settings or {}
         if credentials.cluster_mode or credentials.database_engine == 'Replicated':
             self._conn_settings['database_replicated_enforce_synchronous_settings'] = '1'
             self._conn_settings['insert_quorum'] = 'auto'
-        self._client = self._create_client(credentials)
+        pre = time.time()
+        # Once the database is known to exist, connect straight to it
+        ensured = bool(self.database) and is_prepared(credentials, 'database', self.database)
+        self._client = self._create_client(credentials, self.database if ensured else None)
         check_exchange = credentials.check_exchange and not credentials.cluster_mode
         try:
-            self._ensure_database(credentials.database_engine)
+            if not ensured:
+                self._ensure_database(credentials.database_engine)
             self.server_version = self._server_version()
             self.atomic_exchange = not check_exchange or self._check_atomic_exchange()
         except Exception as ex:
             self.close()
             raise ex
+        metrics.observe('handshake', time.time() - pre)
+        logger.debug(
+            f'Connection handshake took {(time.time() - pre) * 1000:.0f} ms'
+            f'{"" if ensured else " including database setup"}'
+        )
 
     @abstractmethod
     def query(self, sql: str, **kwargs):
@@ -69,15 +302,70 @@ class BhClientWrapper(ABC):
     def command(self, sql: str, **kwargs):
         pass
 
-    def database_dropped(self, database: str):
+    @abstractmethod
+    def insert(self, sql: str, columns: List[list]):
+        """
+        Run an INSERT ... VALUES statement with its data given as one list per column.
+        """
+        pass
+
+    @abstractmethod
+    def fetch(self, sql: str, settings: Optional[Dict[str, Any]] = None):
+        """
+        Run a statement as is, without any rewriting, and return the raw result rows.
+        """
         pass
 
+    @abstractmethod
+    def stream(self, sql: str, block_rows: int, settings: Optional[Dict[str, Any]] = None):
+        """
+        Run a query and return its column names and types along with an iterator over blocks
+        of at most block_rows rows, read from the server as they arrive.
+        """
+        pass
+
+    @abstractmethod
+    def harvest_columns(
+        self, tables: List[Tuple[str, str]]
+    ) -> Dict[Tuple[str, str], List[MetaColumn]]:
+        """
+        Fetch the columns of many (database, table) pairs in as few round trips as possible.
+        """
+        pass
+
+    @abstractmethod
+    def query_statistics(self) -> Dict[str, Any]:
+        """
+        Rows and bytes read and written by the last statement, its result rows and elapsed
+        seconds, as far as the server reported them.
+        """
+        pass
+
+    @abstractmethod
+    def cancel(self, timeout: float) -> bool:
+        """
+        Kill the statement this client is running on the server, from another connection, and
+        wait at most timeout seconds for it to stop. Returns whether it has stopped. The client
+        is disconnected and discarded, its private databases dropped from the other connection.
+        """
+        pass
+
+    def database_dropped(self, database: str):
+        forget_prepared(self._credentials, 'database', database)
+
     @abstractmethod
     def close(self):
         pass
 
     @abstractmethod
-    def _create_client(self, credentials: ByteHouseCredentials):
+    def is_healthy(self) -> bool:
+        """
+        Whether the connection is still usable, checked before a pooled client is reused.
+        """
+        pass
+
+    @abstractmethod
+    def _create_client(self, credentials: ByteHouseCredentials, database: Optional[str] = None):
         pass
 
     @abstractmethod
@@ -94,6 +382,7 @@ class BhClientWrapper(ABC):
         # TODO: log & exception handling
         self.command(f'CREATE DATABASE IF NOT EXISTS {self.database}')
         self._set_client_database()
+        mark_prepared(self._credentials, 'database', self.database)
 
     def _check_atomic_exchange(self) -> bool:
         return False
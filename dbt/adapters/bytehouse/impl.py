@@ -17,29 +17,88 @@
 """
 
 import csv
+import dataclasses
 import io
+import os
 from concurrent.futures import Future
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Callable, Dict, List, Optional, Set, Union
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
 
 import agate
 import dbt.exceptions
+import dbt.flags
 from dbt.adapters.base import AdapterConfig, available
 from dbt.adapters.base.impl import catch_as_completed
 from dbt.adapters.base.relation import BaseRelation, InformationSchema
 from dbt.adapters.sql import SQLAdapter
 from dbt.clients.agate_helper import table_from_rows
+from dbt.contracts.graph.compiled import CompileResultNode
 from dbt.contracts.graph.manifest import Manifest
 from dbt.contracts.relation import RelationType
 from dbt.events import AdapterLogger
+from dbt.events.functions import get_invocation_id
 from dbt.utils import executor, filter_null_values
 
 from dbt.adapters.bytehouse.column import ByteHouseColumn
 from dbt.adapters.bytehouse.connections import ByteHouseConnectionManager
+from dbt.adapters.bytehouse.costs import aggregate_costs, query_log_sql, write_cost_report
+from dbt.adapters.bytehouse.dbclient import BhClientWrapper, prewarm_warehouse
+from dbt.adapters.bytehouse.metadata import MetadataCatalog, attach_metadata_store
+from dbt.adapters.bytehouse.metrics import create_sink, metrics
+from dbt.adapters.bytehouse.profiling import profiled, start_profiler
 from dbt.adapters.bytehouse.relation import ByteHouseRelation
-
+from dbt.adapters.bytehouse.results import check_result_format
+from dbt.adapters.bytehouse.seeds import (
+    CSV_CHUNK_BYTES,
+    CSV_DATA_PLACEHOLDER,
+    ROW_HASH_COLUMN,
+    ROW_HASH_TYPE,
+    InferredColumn,
+    batch_rows,
+    csv_structure,
+    diff_row_hashes,
+    infer_seed_types,
+    iter_csv_chunks,
+    iter_delta_chunks,
+    iter_seed_chunks,
+    needs_client_conversion,
+    parse_size,
+    quote_string,
+    row_hashes,
+    seed_columns,
+    seed_fingerprint,
+)
+
+logger = AdapterLogger('bytehouse')
+
+METADATA_STORE_FILE = 'bytehouse_metadata.db'
+# Commands that run queries, for which the warehouse is resumed while dbt parses the project
+QUERY_COMMANDS = {
+    'build',
+    'compile',
+    'generate',
+    'run',
+    'run-operation',
+    'seed',
+    'snapshot',
+    'source-freshness',
+    'test',
+}
 GET_CATALOG_MACRO_NAME = 'get_catalog'
 LIST_SCHEMAS_MACRO_NAME = 'list_schemas'
+CATALOG_COLUMN_NAMES = [
+    'table_database',
+    'table_schema',
+    'table_name',
+    'table_type',
+    'table_comment',
+    'column_name',
+    'column_index',
+    'column_type',
+    'column_comment',
+    'table_owner',
+]
 
 
 @dataclass
@@ -47,6 +106,14 @@ class ByteHouseConfig(AdapterConfig):
     engine: str = 'MergeTree()'
     order_by: Optional[Union[List[str], str]] = 'tuple()'
     partition_by: Optional[Union[List[str], str]] = None
+    batch_size: Optional[Union[int, str]] = None
+    insert_workers: int = 1
+    csv_passthrough: bool = False
+    compact_types: bool = False
+    skip_unchanged: bool = False
+    delta_load: bool = False
+    warehouse: Optional[str] = None
+    query_weight: int = 1
 
 
 class ByteHouseAdapter(SQLAdapter):
@@ -56,6 +123,47 @@ class ByteHouseAdapter(SQLAdapter):
     AdapterSpecificConfigs = ByteHouseConfig
     logger = AdapterLogger("dbt_bytehouse_tests")
 
+    def __init__(self, config):
+        super().__init__(config)
+        self._compact_types: Dict[str, Tuple[int, List[InferredColumn]]] = {}
+        self._seed_fingerprints: Dict[str, str] = {}
+        credentials = config.credentials
+        target_dir = os.path.join(config.project_root, config.target_path)
+        if credentials.metadata_cache and credentials.metadata_cache_ttl > 0:
+            attach_metadata_store(credentials, os.path.join(target_dir, METADATA_STORE_FILE))
+        if credentials.metrics_sink:
+            try:
+                metrics.set_sinks([create_sink(credentials.metrics_sink, target_dir)])
+            except ValueError as exp:
+                raise dbt.exceptions.RuntimeException(str(exp))
+        start_profiler(target_dir)
+        if credentials.warehouse_prewarm and dbt.flags.WHICH in QUERY_COMMANDS:
+            warehouses = {credentials.warehouse, *(credentials.warehouses or {}).values()}
+            for warehouse in filter(None, warehouses):
+                prewarm_warehouse(dataclasses.replace(credentials, warehouse=warehouse))
+
+    @contextmanager
+    def connection_named(self, name: str, node: Optional[CompileResultNode] = None):
+        """
+        Route the connection of a node to the warehouse of its `warehouse` config, or to the
+        warehouse the profile sets for its resource type in `warehouses`. Its heavy statements
+        take `query_weight` admission slots. With profiling on, everything the node does
+        meanwhile, rendering included, is profiled as part of it.
+        """
+        weight = node.config.get('query_weight', 1) if node is not None else 1
+        self.connections.set_node_routing(self._node_warehouse(node), weight)
+        try:
+            with profiled(name), super().connection_named(name, node):
+                yield
+        finally:
+            self.connections.set_node_routing()
+
+    def _node_warehouse(self, node: Optional[CompileResultNode]) -> Optional[str]:
+        if node is None:
+            return None
+        routes = self.config.credentials.warehouses or {}
+        return node.config.get('warehouse') or routes.get(str(node.resource_type))
+
     @classmethod
     def date_function(cls):
         return 'now()'
@@ -121,9 +229,34 @@ class ByteHouseAdapter(SQLAdapter):
         ch_db = self.get_ch_database(schema)
         return ch_db and ch_db.engine in ('Atomic', 'Replicated')
 
-    def check_schema_exists(self, database, schema):
+    def _from_metadata(
+        self, lookup: Callable[[MetadataCatalog, BhClientWrapper], Any]
+    ) -> Optional[Any]:
+        """
+        Answer an introspection request from the in-process metadata catalog. Returns None when
+        the catalog is disabled or the lookup fails, in which case callers fall back to the
+        system_meta macros.
+        """
+        client = self.connections.get_thread_connection().handle
+        if client.metadata is None:
+            return None
+        try:
+            return lookup(client.metadata, client)
+        except dbt.exceptions.RuntimeException as exp:
+            logger.debug('Metadata catalog lookup failed, using system_meta instead: {}', exp)
+            return None
+
+    def list_schemas(self, database: str) -> List[str]:
+        names = self._from_metadata(
+            lambda metadata, client: [db.name for db in metadata.databases(client.fetch)]
+        )
+        if names is not None:
+            return names
         results = self.execute_macro(LIST_SCHEMAS_MACRO_NAME, kwargs={'database': database})
-        return schema in (row[0] for row in results)
+        return [row[0] for row in results]
+
+    def check_schema_exists(self, database, schema):
+        return schema in self.list_schemas(database)
 
     def drop_schema(self, relation: BaseRelation) -> None:
         super().drop_schema(relation)
@@ -142,8 +275,22 @@ class ByteHouseAdapter(SQLAdapter):
     def list_relations_without_caching(
         self, schema_relation: ByteHouseRelation
     ) -> List[ByteHouseRelation]:
-        kwargs = {'schema_relation': schema_relation}
-        results = self.execute_macro('list_relations_without_caching', kwargs=kwargs)
+        def lookup(metadata: MetadataCatalog, client: BhClientWrapper):
+            database = metadata.get_database(client.fetch, schema_relation.schema)
+            return [
+                (
+                    table.name,
+                    table.database,
+                    'view' if table.is_view else 'table',
+                    database.engine if database else '',
+                )
+                for table in metadata.tables(client.fetch, schema_relation.schema)
+            ]
+
+        results = self._from_metadata(lookup)
+        if results is None:
+            kwargs = {'schema_relation': schema_relation}
+            results = self.execute_macro('list_relations_without_caching', kwargs=kwargs)
         conn_supports_exchange = self.supports_atomic_exchange()
 
         relations = []
@@ -164,8 +311,30 @@ class ByteHouseAdapter(SQLAdapter):
             )
             relations.append(relation)
 
+        client = self.connections.get_thread_connection().handle
+        # Listed views may be materialized views, which are dropped and renamed like tables
+        client.relation_types.remember_listing(
+            schema_relation.schema, {r.identifier: None if r.is_view else False for r in relations}
+        )
         return relations
 
+    def _remember_relation_type(self, relation: ByteHouseRelation) -> None:
+        # A view relation may also be a materialized view, leave those to the client
+        if relation.type is None or relation.is_view or not relation.identifier:
+            return
+        client = self.connections.get_thread_connection().handle
+        schema = relation.schema or client.database
+        client.relation_types.remember(schema, relation.identifier, False)
+
+    def drop_relation(self, relation: ByteHouseRelation) -> None:
+        self._remember_relation_type(relation)
+        super().drop_relation(relation)
+
+    def rename_relation(self, from_relation: ByteHouseRelation, to_relation: ByteHouseRelation):
+        self._remember_relation_type(from_relation)
+        self._remember_relation_type(to_relation)
+        super().rename_relation(from_relation, to_relation)
+
     def get_relation(self, database: Optional[str], schema: str, identifier: str):
         if not self.Relation.include_policy.database:
             database = None
@@ -174,6 +343,13 @@ class ByteHouseAdapter(SQLAdapter):
 
     @available
     def get_ch_database(self, schema: str):
+        found = self._from_metadata(
+            lambda metadata, client: [metadata.get_database(client.fetch, schema)]
+        )
+        if found is not None:
+            if found[0] is None:
+                return None
+            return ByteHouseDatabase(found[0].name, found[0].engine, found[0].comment)
         try:
             results = self.execute_macro('bytehouse__get_database', kwargs={'database': schema})
             if len(results.rows):
@@ -196,6 +372,16 @@ class ByteHouseAdapter(SQLAdapter):
         ]
 
     def get_columns_in_relation(self, relation: ByteHouseRelation) -> List[ByteHouseColumn]:
+        def lookup(metadata: MetadataCatalog, client: BhClientWrapper):
+            schema = relation.schema or client.database
+            return [
+                ByteHouseColumn(column=column.name, dtype=column.type)
+                for column in metadata.columns(client.fetch, schema, relation.identifier)
+            ]
+
+        columns = self._from_metadata(lookup)
+        if columns is not None:
+            return columns
         rows: List[agate.Row] = super().get_columns_in_relation(relation)
         return self.parse_bytehouse_columns(relation, rows)
 
@@ -230,7 +416,33 @@ class ByteHouseAdapter(SQLAdapter):
                 f'Expected only one schema in bytehouse _get_one_catalog, found ' f'{schemas}'
             )
 
-        return super()._get_one_catalog(information_schema, schemas, manifest)
+        def lookup(metadata: MetadataCatalog, client: BhClientWrapper):
+            rows = []
+            for schema in schemas:
+                columns = metadata.schema_columns(client.fetch, client.harvest_columns, schema)
+                for table in metadata.tables(client.fetch, schema):
+                    for column in columns.get(table.name, []):
+                        rows.append(
+                            [
+                                None,
+                                schema,
+                                table.name,
+                                'view' if table.is_view else 'table',
+                                table.comment,
+                                column.name,
+                                column.position,
+                                column.type,
+                                column.comment,
+                                None,
+                            ]
+                        )
+            return rows
+
+        rows = self._from_metadata(lookup)
+        if rows is None:
+            return super()._get_one_catalog(information_schema, schemas, manifest)
+        table = table_from_rows(rows, CATALOG_COLUMN_NAMES)
+        return self._catalog_filter_table(table, manifest)
 
     @classmethod
     def _catalog_filter_table(cls, table: agate.Table, manifest: Manifest) -> agate.Table:
@@ -289,40 +501,362 @@ class ByteHouseAdapter(SQLAdapter):
         return clause
 
     @available
-    def get_csv_data(self, table):
-        # TODO: Consider passing table to macro
-        row_count = len(table.rows)
-        column_count = 0
-        if row_count > 0:
-            column_count = len(table.rows[0])
-
-        # TODO: Use hashmap for conversion
-        # TODO: Implement all datatypes
-        datatypes = []
-        for c in table._column_types:
-            if isinstance(c, dbt.clients.agate_helper.Number):
-                datatypes.append("Int")
-            elif isinstance(c, dbt.clients.agate_helper.ISODateTime):
-                datatypes.append("Datetime")
-            elif isinstance(c, agate.data_types.boolean.Boolean):
-                datatypes.append("BooleanInt")
-            elif isinstance(c, agate.data_types.date_time.DateTime):
-                datatypes.append("Datetime")
-            elif isinstance(c, agate.data_types.number.Number):
-                datatypes.append("Int")
-            elif isinstance(c, agate.data_types.text.Text):
-                datatypes.append("String")
-            else:
-                datatypes.append("NotImplemented")
-
-        data = "|" + str(row_count)
-        data += "|" + str(column_count)
-        for datatype in datatypes:
-            data += "|" + datatype
-        for row in table.rows:
-            for datatype, val in enumerate(row):
-                data += "|" + str(val)
-        return data
+    def get_seed_column_types(self, model, agate_table: agate.Table) -> List[str]:
+        column_override = model['config'].get('column_types', {})
+        if model['config'].get('compact_types', False):
+            inferred = [column.type for column in self._infer_compact_types(model, agate_table)]
+        else:
+            inferred = [
+                self.convert_type(agate_table, idx) for idx in range(len(agate_table.column_names))
+            ]
+        return [
+            column_override.get(col_name, inferred[idx])
+            for idx, col_name in enumerate(agate_table.column_names)
+        ]
+
+    def _infer_compact_types(self, model, agate_table: agate.Table) -> List[InferredColumn]:
+        # The seed materialization asks for the types when creating and again when loading
+        cached = self._compact_types.get(model['unique_id'])
+        if cached and cached[0] == id(agate_table):
+            return cached[1]
+        inferred = infer_seed_types(agate_table)
+        self._compact_types[model['unique_id']] = (id(agate_table), inferred)
+        raw = sum(column.raw_bytes for column in inferred)
+        compressed = sum(column.compressed_bytes for column in inferred)
+        logger.info(
+            f'Seed {model["name"]}: {len(agate_table.rows)} rows, estimated size '
+            f'{raw / 1024:.0f} KiB uncompressed, {compressed / 1024:.0f} KiB compressed'
+        )
+        for name, column in zip(agate_table.column_names, inferred):
+            logger.debug(
+                f'  {name} {column.type}: {column.raw_bytes} bytes, '
+                f'~{column.compressed_bytes} bytes compressed'
+            )
+        return inferred
+
+    def _load_through_staging(
+        self, relation: ByteHouseRelation, load: Callable[[ByteHouseRelation], bool]
+    ) -> bool:
+        """
+        Run `load` against an empty copy of the table and swap the copy in when it returns True,
+        so a load failing midway leaves the table as it was. The copy is dropped unless it holds
+        the only loaded rows, after the table was dropped but could not be replaced by it.
+        """
+        staging = relation.incorporate(path={'identifier': f'{relation.identifier}__dbt_seed'})
+        self.execute(f'drop table if exists {staging.render()}')
+        self.execute(f'create table {staging.render()} as {relation.render()}')
+        keep_staging = False
+        try:
+            loaded = load(staging)
+            if loaded and self.can_exchange(relation.schema, 'table'):
+                self.execute(f'exchange tables {staging.render()} and {relation.render()}')
+            elif loaded:
+                self.execute(f'drop table if exists {relation.render()}')
+                keep_staging = True
+                try:
+                    self.execute(f'rename table {staging.render()} to {relation.render()}')
+                except Exception:
+                    logger.error(
+                        f'{relation} was dropped but could not be replaced, '
+                        f'the loaded rows are kept in {staging}'
+                    )
+                    raise
+        finally:
+            if not keep_staging:
+                self.execute(f'drop table if exists {staging.render()}')
+        return loaded
+
+    @available
+    def insert_seed_columns(
+        self,
+        sql: str,
+        agate_table: agate.Table,
+        column_types: List[str],
+        batch_size: Optional[Union[int, str]] = None,
+        workers: int = 1,
+        relation: Optional[ByteHouseRelation] = None,
+    ) -> None:
+        """
+        Insert the rows of a seed as typed column blocks, either all at once or in chunks of
+        batch_size spread over several connections. Chunks are converted from the agate table
+        dbt already holds in memory, so batch_size bounds the size of each insert but not the
+        memory used by the seed. When `relation`, the table `sql` inserts into, is given, the
+        chunks are loaded into a staging table swapped in at the end.
+        """
+        if not len(agate_table.rows):
+            return
+        try:
+            rows_per_chunk = batch_rows(batch_size, agate_table)
+        except ValueError as exp:
+            raise dbt.exceptions.CompilationException(str(exp))
+        if rows_per_chunk is None:
+            with metrics.timed('seed_serialization'):
+                columns = seed_columns(agate_table, column_types)
+            self.connections.insert_columns(sql, columns)
+            return
+
+        def insert(target: ByteHouseRelation) -> bool:
+            chunks = iter_seed_chunks(agate_table, column_types, rows_per_chunk)
+            chunks = metrics.timed_iter('seed_serialization', chunks)
+            target_sql = sql
+            if relation is not None:
+                target_sql = sql.replace(relation.render(), target.render(), 1)
+            self.connections.insert_column_chunks(target_sql, chunks, workers)
+            return True
+
+        if relation is None or len(agate_table.rows) <= rows_per_chunk:
+            insert(relation)
+        else:
+            self._load_through_staging(relation, insert)
+
+    @available
+    def insert_seed_file(
+        self, relation: ByteHouseRelation, model, agate_table: agate.Table, column_types: List[str]
+    ) -> bool:
+        """
+        Send the raw seed file to the server and let it parse the CSV. Each chunk is sent as a
+        string literal within the statement, so batch_size also bounds the statement size. The
+        chunks are loaded into a staging table swapped in once all of them are in. Returns False
+        when the seed needs conversion in Python or the server cannot parse it, in which case
+        the caller loads it with typed inserts instead.
+        """
+        path = os.path.join(model['root_path'], model['original_file_path'])
+        if needs_client_conversion(agate_table, column_types, path):
+            return False
+        batch_size = model['config'].get('batch_size')
+        chunk_bytes = CSV_CHUNK_BYTES
+        if isinstance(batch_size, str):
+            try:
+                chunk_bytes = parse_size(batch_size)
+            except ValueError as exp:
+                raise dbt.exceptions.CompilationException(str(exp))
+        structure = quote_string(csv_structure(agate_table.column_names, column_types))
+        settings = self.get_model_settings(model)
+
+        def insert(target: ByteHouseRelation) -> bool:
+            # Columns are listed in the seed file order, which is also the order of the table
+            sql = (
+                f'insert into {target.render()} select * from format(CSV, {structure}, '
+                f'{CSV_DATA_PLACEHOLDER}) {settings}'
+            )
+            return self.connections.insert_csv_chunks(sql, iter_csv_chunks(path, chunk_bytes))
+
+        return self._load_through_staging(relation, insert)
+
+    @available
+    def get_seed_fingerprint(self, model) -> str:
+        """
+        Hash of the seed file and of the configs shaping its table, stored as the table comment.
+        """
+        if model['unique_id'] not in self._seed_fingerprints:
+            path = os.path.join(model['root_path'], model['original_file_path'])
+            fingerprint = seed_fingerprint(path, model['config'])
+            self._seed_fingerprints[model['unique_id']] = fingerprint
+        return self._seed_fingerprints[model['unique_id']]
+
+    @available
+    def is_seed_unchanged(self, relation: Optional[ByteHouseRelation], model) -> bool:
+        """
+        Whether skip_unchanged is set and the table already holds the current seed file.
+        """
+        if relation is None or not model['config'].get('skip_unchanged', False):
+            return False
+        comment = self._get_relation_comment(relation)
+        return comment is not None and self.get_seed_fingerprint(model) in comment
+
+    def _get_relation_comment(self, relation: ByteHouseRelation) -> Optional[str]:
+        def lookup(metadata: MetadataCatalog, client: BhClientWrapper):
+            table = metadata.get_table(client.fetch, relation.schema, relation.identifier)
+            return [table.comment if table else None]
+
+        found = self._from_metadata(lookup)
+        if found is not None:
+            return found[0]
+        client = self.connections.get_thread_connection().handle
+        for row in client.fetch(f'SHOW TABLES FROM {relation.schema}'):
+            if row[0] == relation.identifier:
+                return row[7]
+        return None
+
+    @available
+    def get_seed_row_hash_column(self, model) -> Optional[str]:
+        """
+        Definition of the row hash column added to the table of a seed loaded with delta_load.
+        """
+        if not model['config'].get('delta_load', False):
+            return None
+        return f'{ROW_HASH_COLUMN} {ROW_HASH_TYPE}'
+
+    @available
+    def can_load_seed_delta(
+        self, relation: Optional[ByteHouseRelation], model, agate_table: agate.Table
+    ) -> bool:
+        """
+        Whether delta_load is set and the existing table has the columns the seed would be
+        created with, so that only the differences need to be loaded.
+        """
+        if relation is None or not model['config'].get('delta_load', False):
+            return False
+
+        def shape(columns):
+            # Nullability is compared too, NULLs cannot be inserted into a non-Nullable column
+            return [(name, dtype.replace(' ', '')) for name, dtype in columns]
+
+        column_types = self.get_seed_column_types(model, agate_table)
+        expected = list(zip(agate_table.column_names, column_types))
+        expected.append((ROW_HASH_COLUMN, ROW_HASH_TYPE))
+        existing = [(col.name, col.dtype) for col in self.get_columns_in_relation(relation)]
+        return shape(existing) == shape(expected)
+
+    @available
+    def load_seed_delta(
+        self, relation: ByteHouseRelation, model, agate_table: agate.Table, column_types: List[str]
+    ) -> str:
+        """
+        Bring the table of a delta loaded seed up to date. Rows whose hash is not in the table
+        are inserted. Partitions holding changed or deleted rows are rebuilt in a staging table
+        and swapped in, so readers never see a partially applied change.
+        """
+        hashes = row_hashes(agate_table)
+        stored = self.connections.fetch_rows(f'select {ROW_HASH_COLUMN} from {relation.render()}')
+        indexes, removed = diff_row_hashes(hashes, [row[0] for row in stored])
+        logger.info(
+            f'Seed {model["name"]}: inserting {len(indexes)} new rows, '
+            f'removing {len(removed)} changed or deleted rows'
+        )
+        quote_config = model['config'].get('quote_columns')
+        columns = [self.quote_seed_column(name, quote_config) for name in agate_table.column_names]
+        columns.append(ROW_HASH_COLUMN)
+        settings = self.get_model_settings(model)
+
+        def insert(target: ByteHouseRelation) -> str:
+            sql = f'insert into {target.render()} ({", ".join(columns)}){settings} VALUES'
+            if not indexes:
+                return sql
+            try:
+                rows_per_chunk = batch_rows(model['config'].get('batch_size'), agate_table)
+            except ValueError as exp:
+                raise dbt.exceptions.CompilationException(str(exp))
+            chunks = iter_delta_chunks(
+                agate_table, column_types, indexes, hashes, rows_per_chunk or len(indexes)
+            )
+            chunks = metrics.timed_iter('seed_serialization', chunks)
+            workers = model['config'].get('insert_workers', 1)
+            self.connections.insert_column_chunks(sql, chunks, workers)
+            return sql
+
+        if not removed:
+            return insert(relation)
+
+        removed_sql = ', '.join(str(row_hash) for row_hash in removed)
+        affected = [
+            row[0]
+            for row in self.connections.fetch_rows(
+                f'select distinct _partition_id from {relation.render()} '
+                f'where {ROW_HASH_COLUMN} in ({removed_sql})'
+            )
+        ]
+        affected_sql = ', '.join(quote_string(partition) for partition in affected)
+        staging = relation.incorporate(path={'identifier': f'{relation.identifier}__dbt_delta'})
+        self.execute(f'drop table if exists {staging.render()}')
+        self.execute(f'create table {staging.render()} as {relation.render()}')
+        try:
+            sql = insert(staging)
+            self.execute(
+                f'insert into {staging.render()} select * from {relation.render()} '
+                f'where _partition_id in ({affected_sql}) '
+                f'and {ROW_HASH_COLUMN} not in ({removed_sql})'
+            )
+            staged = {
+                row[0]
+                for row in self.connections.fetch_rows(
+                    f'select distinct _partition_id from {staging.render()}'
+                )
+            }
+            for partition in affected:
+                if partition in staged:
+                    self.execute(
+                        f'alter table {relation.render()} replace partition id '
+                        f'{quote_string(partition)} from {staging.render()}'
+                    )
+                else:
+                    self.execute(
+                        f'alter table {relation.render()} drop partition id '
+                        f'{quote_string(partition)}'
+                    )
+            if staged.difference(affected):
+                self.execute(
+                    f'insert into {relation.render()} select * from {staging.render()} '
+                    f'where _partition_id not in ({affected_sql})'
+                )
+        finally:
+            self.execute(f'drop table if exists {staging.render()}')
+        return sql
+
+    @available
+    def execute_columnar(self, sql: str, result_format: str = 'numpy') -> Any:
+        """
+        Run a query and return its result column by column, without per-row Python objects:
+        'numpy' gives a dict of numpy arrays, 'arrow' a pyarrow.Table and 'columns' a dict of
+        the sequences read by the driver.
+        """
+        try:
+            check_result_format(result_format)
+        except ValueError as exp:
+            raise dbt.exceptions.CompilationException(str(exp))
+        _, result = self.connections.execute(sql, fetch=True, result_format=result_format)
+        return result
+
+    @available
+    def execute_stream(
+        self,
+        sql: str,
+        block_rows: int = 65536,
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        result_format: Optional[str] = None,
+    ) -> Iterator[Any]:
+        """
+        Run a query and iterate over its result in blocks of at most block_rows rows, keeping
+        one block in memory at a time. max_rows and max_bytes default to the result_max_rows
+        and result_max_bytes profile options, 0 meaning no limit.
+        """
+        if result_format is not None:
+            try:
+                check_result_format(result_format)
+            except ValueError as exp:
+                raise dbt.exceptions.CompilationException(str(exp))
+        credentials = self.config.credentials
+        return self.connections.execute_stream(
+            sql,
+            max(1, block_rows),
+            credentials.result_max_rows if max_rows is None else max_rows,
+            credentials.result_max_bytes if max_bytes is None else max_bytes,
+            result_format,
+        )
+
+    @available
+    def write_cost_report(self, query_log: str = 'system.query_log') -> str:
+        """
+        Fetch the server cost of every statement of this invocation from the query log in one
+        query, and write it per node to target/bytehouse_costs.json and .csv. Meant for an
+        on-run-end hook, returns the path of the JSON report.
+        """
+        invocation_id = get_invocation_id()
+        try:
+            # Query log entries are written in the background, make them visible now
+            self.connections.fetch_rows('SYSTEM FLUSH LOGS')
+        except dbt.exceptions.RuntimeException as exp:
+            logger.debug(f'Could not flush the query log: {exp}')
+        try:
+            rows = self.connections.fetch_rows(query_log_sql(invocation_id, query_log))
+        except dbt.exceptions.RuntimeException as exp:
+            logger.debug(f'CPU time is not available from {query_log}: {exp}')
+            rows = self.connections.fetch_rows(query_log_sql(invocation_id, query_log, False))
+        directory = os.path.join(self.config.project_root, self.config.target_path)
+        path = write_cost_report(directory, invocation_id, aggregate_costs(rows))
+        logger.debug(f'Wrote the cost of {len(rows)} statements to {path}')
+        return path
 
     def run_sql_for_tests(self, sql, fetch, conn):
         client = conn.handle
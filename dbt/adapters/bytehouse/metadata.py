@@ -0,0 +1,571 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from dbt.events import AdapterLogger
+
+from dbt.adapters.bytehouse.metrics import metrics
+
+logger = AdapterLogger('bytehouse')
+
+Executor = Callable[[str], List[tuple]]
+Harvester = Callable[[List[Tuple[str, str]]], Dict[Tuple[str, str], List['MetaColumn']]]
+
+# Relation types listed as views, as the list_relations_without_caching macro does
+VIEW_TYPES = ('MaterializedView', 'View', 'VIEW')
+# Type of the views whose DROP and RENAME statements are rewritten
+PLAIN_VIEW_TYPE = 'VIEW'
+
+_comment_re = re.compile(r'^\s*(/\*.*?\*/\s*|--[^\n]*\n\s*)*', re.DOTALL)
+_name = r'(?P<name>[`"\w.]+)'
+_create_db_re = re.compile(r'^create\s+database\s+(if\s+not\s+exists\s+)?' + _name, re.IGNORECASE)
+_drop_db_re = re.compile(r'^drop\s+database\s+(if\s+exists\s+)?' + _name, re.IGNORECASE)
+_create_rel_re = re.compile(
+    r'^create\s+(or\s+replace\s+)?(temporary\s+)?(?P<kind>materialized\s+view|view|table)\s+'
+    r'(if\s+not\s+exists\s+)?' + _name,
+    re.IGNORECASE,
+)
+_drop_rel_re = re.compile(r'^drop\s+(table|view)\s+(if\s+exists\s+)?' + _name, re.IGNORECASE)
+_alter_re = re.compile(r'^alter\s+table\s+' + _name, re.IGNORECASE)
+_rename_re = re.compile(
+    r'^rename\s+table\s+(?P<old>[`"\w.]+)\s+to\s+(?P<new>[`"\w.]+)', re.IGNORECASE
+)
+_exchange_re = re.compile(
+    r'^exchange\s+tables\s+(?P<old>[`"\w.]+)\s+and\s+(?P<new>[`"\w.]+)', re.IGNORECASE
+)
+_scope_schema_re = re.compile(r"\b(?:schema|database)\s*=\s*'([^']*)'", re.IGNORECASE)
+_scope_table_re = re.compile(r"\btable\s*=\s*'([^']*)'", re.IGNORECASE)
+
+
+@dataclass
+class MetaDatabase:
+    name: str
+    engine: str
+    comment: str
+
+
+@dataclass
+class MetaTable:
+    name: str
+    database: str
+    type: str
+    comment: str = ''
+
+    @property
+    def is_view(self) -> bool:
+        return self.type in VIEW_TYPES
+
+
+@dataclass
+class MetaColumn:
+    name: str
+    type: str
+    position: int
+    comment: str = ''
+
+
+class MetadataCatalog:
+    """
+    In-process cache of ByteHouse databases, tables and columns.
+
+    Each level is loaded lazily from the server the first time it is requested and is kept up to
+    date afterwards by feeding every DDL statement the adapter issues through `observe`. Loading
+    only needs a callable that executes a statement and returns the raw rows, so the catalog can
+    be shared by every connection in the process.
+    """
+
+    def __init__(self):
+        # Guards the cached state only, statements are never run while holding it
+        self._lock = threading.RLock()
+        self._load_locks: Dict[tuple, threading.Lock] = {}
+        self._versions: Dict[str, int] = {}
+        self._databases: Optional[Dict[str, MetaDatabase]] = None
+        self._tables: Dict[str, Dict[str, MetaTable]] = {}
+        self._columns: Dict[Tuple[str, str], List[MetaColumn]] = {}
+        self._store: Optional[MetadataStore] = None
+
+    def attach_store(self, store: 'MetadataStore') -> None:
+        """
+        Back the catalog with a persistent store, used before going to the server.
+        """
+        with self._lock:
+            self._store = store
+
+    def databases(self, execute: Executor) -> List[MetaDatabase]:
+        def put(value):
+            self._databases = value
+
+        def fetch():
+            rows = execute('SHOW DATABASES')
+            return {row[0]: MetaDatabase(row[0], row[8], row[7]) for row in rows}
+
+        databases = self._load(('databases',), '', lambda: self._databases, put, fetch)
+        with self._lock:
+            return list(databases.values())
+
+    def get_database(self, execute: Executor, name: str) -> Optional[MetaDatabase]:
+        for database in self.databases(execute):
+            if database.name == name:
+                return database
+        return None
+
+    def tables(self, execute: Executor, database: str) -> List[MetaTable]:
+        if self.get_database(execute, database) is None:
+            return []
+        tables = self._load(
+            ('tables', database),
+            database,
+            lambda: self._tables.get(database),
+            lambda value: self._tables.__setitem__(database, value),
+            lambda: {
+                row[0]: MetaTable(row[0], database, row[8], row[7])
+                for row in execute(f'SHOW TABLES FROM {database}')
+            },
+        )
+        with self._lock:
+            return list(tables.values())
+
+    def get_table(self, execute: Executor, database: str, name: str) -> Optional[MetaTable]:
+        for table in self.tables(execute, database):
+            if table.name == name:
+                return table
+        return None
+
+    def columns(self, execute: Executor, database: str, table: str) -> List[MetaColumn]:
+        key = (database, table)
+        if self.get_table(execute, database, table) is None:
+            return []
+        columns = self._load(
+            ('columns',) + key,
+            database,
+            lambda: self._columns.get(key),
+            lambda value: self._columns.__setitem__(key, value),
+            lambda: [
+                MetaColumn(row[0], row[1], idx, row[4])
+                for idx, row in enumerate(execute(f'DESCRIBE TABLE {database}.{table}'))
+            ],
+        )
+        return list(columns)
+
+    def schema_columns(
+        self, execute: Executor, harvest: Harvester, database: str
+    ) -> Dict[str, List[MetaColumn]]:
+        """
+        Return the columns of every table in a database, harvesting all missing tables at once.
+        """
+        names = [table.name for table in self.tables(execute, database)]
+        with self._lock:
+            missing = [(database, name) for name in names if (database, name) not in self._columns]
+            version = self._version(database)
+        harvested = {}
+        for key in missing:
+            restored = self._restore(('columns',) + key)
+            if restored is not None:
+                harvested[key] = restored
+        missing = [key for key in missing if key not in harvested]
+        fetched = {}
+        if missing:
+            with metrics.timed('metadata_refresh', kind='harvest'):
+                fetched = harvest(missing)
+        harvested.update(fetched)
+        with self._lock:
+            if self._version(database) == version:
+                self._columns.update(harvested)
+                for key, value in fetched.items():
+                    self._persist(('columns',) + key, database, value)
+            columns = {**self._columns, **harvested}
+            return {name: list(columns.get((database, name), [])) for name in names}
+
+    def _load(self, key: tuple, scope: str, get, put, fetch):
+        """
+        Return a cached value, fetching it first if needed. Concurrent requests for the same key
+        wait for a single fetch, requests for other keys proceed in parallel. A fetched value is
+        only cached when no DDL touched its scope in the meantime.
+        """
+        with self._lock:
+            value = get()
+            if value is not None:
+                return value
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            with self._lock:
+                value = get()
+                if value is not None:
+                    return value
+                version = self._version(scope)
+            value = self._restore(key)
+            restored = value is not None
+            if not restored:
+                with metrics.timed('metadata_refresh', kind=key[0]):
+                    value = fetch()
+            with self._lock:
+                if self._version(scope) == version:
+                    put(value)
+                    if not restored:
+                        self._persist(key, scope, value)
+            return value
+
+    def _restore(self, key: tuple):
+        raw = self._store.get(key) if self._store else None
+        if raw is None:
+            return None
+        if key[0] == 'databases':
+            return {item['name']: MetaDatabase(**item) for item in raw}
+        if key[0] == 'tables':
+            return {item['name']: MetaTable(**item) for item in raw}
+        return [MetaColumn(**item) for item in raw]
+
+    def _persist(self, key: tuple, scope: str, value) -> None:
+        if self._store:
+            items = value.values() if isinstance(value, dict) else value
+            self._store.put(key, scope, [asdict(item) for item in items])
+
+    def _version(self, scope: str) -> Tuple[int, int]:
+        return self._versions.get('', 0), self._versions.get(scope, 0)
+
+    def _bump(self, scope: str) -> None:
+        self._versions[scope] = self._versions.get(scope, 0) + 1
+        if self._store:
+            self._store.invalidate(scope)
+
+    def observe(self, sql: str, default_database: Optional[str]) -> None:
+        """
+        Apply the effect of a statement that has just been run successfully on the server.
+        """
+        ddl = parse_ddl(sql, default_database)
+        if ddl is None:
+            return
+        action, args = ddl[0], ddl[1:]
+        if action == 'create':
+            self._table_created(*args)
+        elif action == 'drop':
+            self._table_dropped(*args)
+        elif action == 'rename':
+            self._table_renamed(*args)
+        elif action == 'exchange':
+            self._tables_exchanged(*args)
+        elif action == 'alter':
+            with self._lock:
+                self._bump(args[0][0])
+                self._columns.pop(args[0], None)
+                # The listing holds table comments, which MODIFY COMMENT changes
+                self._tables.pop(args[0][0], None)
+        elif action == 'create_database':
+            self.database_created(*args)
+        elif action == 'drop_database':
+            self.database_dropped(*args)
+
+    def database_created(self, database: str) -> None:
+        with self._lock:
+            self._bump('')
+            # The engine of a new database is only known to the server, so reload the listing
+            if self._databases is not None and database not in self._databases:
+                self._databases = None
+
+    def database_dropped(self, database: str) -> None:
+        with self._lock:
+            self._bump('')
+            self._bump(database)
+            if self._databases is not None:
+                self._databases.pop(database, None)
+            self._tables.pop(database, None)
+            for key in [key for key in self._columns if key[0] == database]:
+                del self._columns[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bump('')
+            if self._store:
+                self._store.clear()
+            self._databases = None
+            self._tables.clear()
+            self._columns.clear()
+
+    def _table_created(self, key: Tuple[str, str], rel_type: str) -> None:
+        database, name = key
+        with self._lock:
+            self._bump(database)
+            self._columns.pop(key, None)
+            if database in self._tables:
+                self._tables[database][name] = MetaTable(name, database, rel_type)
+
+    def _table_dropped(self, key: Tuple[str, str]) -> None:
+        database, name = key
+        with self._lock:
+            self._bump(database)
+            self._columns.pop(key, None)
+            if database in self._tables:
+                self._tables[database].pop(name, None)
+
+    def _table_renamed(self, old: Tuple[str, str], new: Tuple[str, str]) -> None:
+        with self._lock:
+            self._bump(old[0])
+            self._bump(new[0])
+            table = self._tables.get(old[0], {}).pop(old[1], None)
+            columns = self._columns.pop(old, None)
+            self._columns.pop(new, None)
+            if new[0] not in self._tables:
+                return
+            if table is None:
+                # The type of the renamed relation is unknown, reload the listing on next access
+                del self._tables[new[0]]
+                return
+            self._tables[new[0]][new[1]] = MetaTable(new[1], new[0], table.type, table.comment)
+            if columns is not None:
+                self._columns[new] = columns
+
+    def _tables_exchanged(self, left: Tuple[str, str], right: Tuple[str, str]) -> None:
+        with self._lock:
+            self._bump(left[0])
+            self._bump(right[0])
+            left_table = self._tables.get(left[0], {}).get(left[1])
+            right_table = self._tables.get(right[0], {}).get(right[1])
+            if left_table and right_table:
+                left_table.type, right_table.type = right_table.type, left_table.type
+                left_table.comment, right_table.comment = right_table.comment, left_table.comment
+            left_columns = self._columns.pop(left, None)
+            right_columns = self._columns.pop(right, None)
+            if left_columns is not None:
+                self._columns[right] = left_columns
+            if right_columns is not None:
+                self._columns[left] = right_columns
+
+
+class MetadataStore:
+    """
+    SQLite copy of the metadata catalog that outlives a single dbt invocation, so back to back
+    runs start warm. Entries expire after `ttl` seconds and are removed as soon as the adapter
+    runs DDL in their schema. Changes made outside of dbt are only picked up after expiry.
+    """
+
+    def __init__(self, path: str, namespace: str, ttl: int):
+        self._lock = threading.Lock()
+        self._namespace = namespace
+        self._ttl = ttl
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS metadata (namespace TEXT, key TEXT, scope TEXT, '
+                'value TEXT, updated REAL, PRIMARY KEY (namespace, key))'
+            )
+
+    def get(self, key: tuple) -> Optional[list]:
+        row = self._run(
+            'SELECT value, updated FROM metadata WHERE namespace = ? AND key = ?',
+            (self._namespace, json.dumps(key)),
+        )
+        if not row or time.time() - row[0][1] > self._ttl:
+            return None
+        return json.loads(row[0][0])
+
+    def put(self, key: tuple, scope: str, value: list) -> None:
+        self._run(
+            'INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?)',
+            (self._namespace, json.dumps(key), scope, json.dumps(value), time.time()),
+        )
+
+    def invalidate(self, scope: str) -> None:
+        self._run(
+            'DELETE FROM metadata WHERE namespace = ? AND scope = ?', (self._namespace, scope)
+        )
+
+    def clear(self) -> None:
+        self._run('DELETE FROM metadata WHERE namespace = ?', (self._namespace,))
+
+    def _run(self, sql: str, params: tuple) -> list:
+        try:
+            with self._lock, self._conn:
+                return self._conn.execute(sql, params).fetchall()
+        except sqlite3.Error as ex:
+            logger.debug(f'Metadata store statement failed: {ex}')
+            return []
+
+
+class RelationTypeCache:
+    """
+    Process wide record of which relations are plain views, so DROP and RENAME statements can
+    be rewritten for views without listing the schema first. Filled from relations the adapter
+    already knows about and kept current by the DDL the client runs. Materialized views are
+    not plain views, relations recorded as None may be either and are looked up again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views: Dict[Tuple[str, str], Optional[bool]] = {}
+        # Databases whose full listing has been remembered, absent names there are not views
+        self._listed: Set[str] = set()
+
+    def is_view(self, database: str, name: str) -> Optional[bool]:
+        with self._lock:
+            if (database, name) in self._views:
+                return self._views[(database, name)]
+            if database in self._listed:
+                return False
+            return None
+
+    def remember(self, database: str, name: str, is_view: bool) -> None:
+        with self._lock:
+            self._views[(database, name)] = is_view
+
+    def remember_listing(self, database: str, views: Dict[str, Optional[bool]]) -> None:
+        with self._lock:
+            for key in [key for key in self._views if key[0] == database]:
+                del self._views[key]
+            for name, is_view in views.items():
+                self._views[(database, name)] = is_view
+            self._listed.add(database)
+
+    def observe(self, sql: str, default_database: Optional[str]) -> None:
+        ddl = parse_ddl(sql, default_database)
+        if ddl is None:
+            return
+        action, args = ddl[0], ddl[1:]
+        with self._lock:
+            if action == 'create':
+                self._views[args[0]] = args[1] == PLAIN_VIEW_TYPE
+            elif action == 'drop':
+                self._views.pop(args[0], None)
+            elif action == 'rename':
+                is_view = self._views.pop(args[0], None)
+                self._views.pop(args[1], None)
+                if is_view is None:
+                    self._listed.discard(args[1][0])
+                else:
+                    self._views[args[1]] = is_view
+            elif action == 'exchange':
+                left = self._views.pop(args[0], None)
+                right = self._views.pop(args[1], None)
+                if left is not None and right is not None:
+                    self._views[args[0]], self._views[args[1]] = right, left
+                else:
+                    self._listed.discard(args[0][0])
+                    self._listed.discard(args[1][0])
+            elif action == 'drop_database':
+                self._listed.discard(args[0])
+                for key in [key for key in self._views if key[0] == args[0]]:
+                    del self._views[key]
+
+
+_catalogs: Dict[tuple, MetadataCatalog] = {}
+_relation_types: Dict[tuple, RelationTypeCache] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_metadata_catalog(credentials) -> MetadataCatalog:
+    """
+    Return the process wide catalog for the account the credentials connect to.
+    """
+    key = _catalog_key(credentials)
+    with _catalogs_lock:
+        if key not in _catalogs:
+            _catalogs[key] = MetadataCatalog()
+        return _catalogs[key]
+
+
+def get_relation_type_cache(credentials) -> RelationTypeCache:
+    """
+    Return the process wide relation type cache for the account the credentials connect to.
+    """
+    key = _catalog_key(credentials)
+    with _catalogs_lock:
+        if key not in _relation_types:
+            _relation_types[key] = RelationTypeCache()
+        return _relation_types[key]
+
+
+def attach_metadata_store(credentials, path: str) -> None:
+    """
+    Persist the catalog of the credentials' account in the SQLite file at `path`.
+    """
+    namespace = json.dumps(_catalog_key(credentials) + (credentials.warehouse,))
+    try:
+        store = MetadataStore(path, namespace, credentials.metadata_cache_ttl)
+    except (OSError, sqlite3.Error) as ex:
+        logger.debug(f'Could not open metadata store {path}: {ex}')
+        return
+    get_metadata_catalog(credentials).attach_store(store)
+
+
+def _catalog_key(credentials) -> tuple:
+    return (
+        credentials.host,
+        credentials.port,
+        credentials.region,
+        credentials.account,
+        credentials.user,
+    )
+
+
+def parse_introspection_scope(sql: str) -> Tuple[Optional[Set[str]], Optional[str]]:
+    """
+    Extract the schemas and the table a system_meta introspection query filters on. None means
+    the query is not restricted at that level.
+    """
+    schemas = set(_scope_schema_re.findall(sql)) or None
+    match = _scope_table_re.search(sql)
+    return schemas, match.group(1) if match else None
+
+
+def parse_ddl(sql: str, default_database: Optional[str]) -> Optional[tuple]:
+    """
+    Parse a DDL statement into an action and the (database, name) keys or database names it
+    affects. Returns None for statements that do not change metadata.
+    """
+    sql = _comment_re.sub('', sql, count=1)
+    match = _create_rel_re.match(sql)
+    if match:
+        kind = match.group('kind').lower()
+        rel_type = {'table': 'TABLE', 'view': 'VIEW'}.get(kind, 'MaterializedView')
+        return 'create', _split(match.group('name'), default_database), rel_type
+    match = _drop_rel_re.match(sql)
+    if match:
+        return 'drop', _split(match.group('name'), default_database)
+    for action, regex in (('rename', _rename_re), ('exchange', _exchange_re)):
+        match = regex.match(sql)
+        if match:
+            old = _split(match.group('old'), default_database)
+            new = _split(match.group('new'), default_database)
+            return action, old, new
+    match = _alter_re.match(sql)
+    if match:
+        return 'alter', _split(match.group('name'), default_database)
+    for action, regex in (('create_database', _create_db_re), ('drop_database', _drop_db_re)):
+        match = regex.match(sql)
+        if match:
+            return action, _unquote(match.group('name'))
+    return None
+
+
+def _unquote(identifier: str) -> str:
+    return identifier.strip('`"')
+
+
+def _split(identifier: str, default_database: Optional[str]) -> Tuple[str, str]:
+    parts = [_unquote(part) for part in identifier.split('.')]
+    if len(parts) == 1:
+        return default_database or '', parts[0]
+    return parts[-2], parts[-1]
@@ -0,0 +1,291 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import atexit
+import json
+import os
+import re
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Tuple, TypeVar
+
+T = TypeVar('T')
+
+METRICS_PREFIX = 'dbt_bytehouse'
+PROMETHEUS_FILE = 'bytehouse_metrics.prom'
+JSONL_FILE = 'bytehouse_metrics.jsonl'
+# Upper bounds in seconds of the histogram buckets, from metadata lookups to long models
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_comment_re = re.compile(r'^\s*(/\*.*?\*/\s*|--[^\n]*\n\s*)*', re.DOTALL)
+_keyword_re = re.compile(r'\w+')
+_STATEMENT_KINDS = {
+    'create': 'ddl',
+    'drop': 'ddl',
+    'alter': 'ddl',
+    'rename': 'ddl',
+    'exchange': 'ddl',
+    'truncate': 'ddl',
+    'insert': 'insert',
+    'select': 'select',
+    'with': 'select',
+    'show': 'select',
+    'describe': 'select',
+    'desc': 'select',
+    'exists': 'select',
+}
+
+
+def statement_kind(sql: str) -> str:
+    """
+    Classify a statement as ddl, insert, select or other by its first keyword.
+    """
+    match = _keyword_re.search(_comment_re.sub('', sql, count=1))
+    return _STATEMENT_KINDS.get(match.group(0).lower(), 'other') if match else 'other'
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class MetricsSink:
+    """
+    Destination of the metrics. Sinks are told about every observation as it happens, and
+    flushed with the aggregated histograms and counters when the process exits.
+    """
+
+    def observe(self, name: str, seconds: float, labels: Labels) -> None:
+        pass
+
+    def increment(self, name: str, labels: Labels) -> None:
+        pass
+
+    def flush(self, metrics: 'Metrics') -> None:
+        pass
+
+
+class PrometheusTextfileSink(MetricsSink):
+    """
+    Writes the histograms and counters in the Prometheus text format on flush, for the
+    node exporter's textfile collector.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def flush(self, metrics: 'Metrics') -> None:
+        histograms, counters = metrics.snapshot()
+        lines = []
+        for name in sorted({key[0] for key in histograms}):
+            metric = f'{METRICS_PREFIX}_{name}_seconds'
+            lines.append(f'# TYPE {metric} histogram')
+            for (hist_name, labels), histogram in sorted(histograms.items()):
+                if hist_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    bucket_labels = _prometheus_labels(labels + (('le', str(bound)),))
+                    lines.append(f'{metric}_bucket{bucket_labels} {cumulative}')
+                lines.append(f'{metric}_sum{_prometheus_labels(labels)} {histogram.sum:.6f}')
+                lines.append(f'{metric}_count{_prometheus_labels(labels)} {histogram.count}')
+        for name in sorted({key[0] for key in counters}):
+            metric = f'{METRICS_PREFIX}_{name}_total'
+            lines.append(f'# TYPE {metric} counter')
+            for (counter_name, labels), count in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f'{metric}{_prometheus_labels(labels)} {count}')
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # The collector may read the file at any time, so it is replaced in one step
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, self.path)
+
+
+class StatsdSink(MetricsSink):
+    """
+    Sends every observation as a statsd timer, and every increment as a counter, over UDP.
+    Labels are appended to the metric name.
+    """
+
+    def __init__(self, host: str = 'localhost', port: int = 8125):
+        self._address = (host, port)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def observe(self, name: str, seconds: float, labels: Labels) -> None:
+        self._send(f'{_statsd_name(name, labels)}:{seconds * 1000:.3f}|ms')
+
+    def increment(self, name: str, labels: Labels) -> None:
+        self._send(f'{_statsd_name(name, labels)}:1|c')
+
+    def _send(self, packet: str) -> None:
+        try:
+            self._socket.sendto(packet.encode(), self._address)
+        except OSError:
+            # Metrics must never fail a run
+            pass
+
+
+class FileSink(MetricsSink):
+    """
+    Appends every observation and increment to a file as a line of JSON.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def observe(self, name: str, seconds: float, labels: Labels) -> None:
+        self._write({'name': name, 'seconds': round(seconds, 6), 'labels': dict(labels)})
+
+    def increment(self, name: str, labels: Labels) -> None:
+        self._write({'name': name, 'increment': 1, 'labels': dict(labels)})
+
+    def _write(self, record: dict) -> None:
+        with self._lock, open(self.path, 'a') as f:
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+class Metrics:
+    """
+    Latency histograms and counters of the adapter's hot paths, handed to the configured
+    sinks. Without sinks nothing is recorded.
+    """
+
+    def __init__(self):
+        self._sinks: List[MetricsSink] = []
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._counters: Dict[Tuple[str, Labels], int] = {}
+        self._lock = threading.Lock()
+
+    def add_sink(self, sink: MetricsSink) -> None:
+        self._sinks.append(sink)
+
+    def set_sinks(self, sinks: Iterable[MetricsSink]) -> None:
+        self._sinks = list(sinks)
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        if not self._sinks:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+        for sink in self._sinks:
+            sink.observe(name, seconds, key[1])
+
+    def increment(self, name: str, **labels: str) -> None:
+        if not self._sinks:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+        for sink in self._sinks:
+            sink.increment(name, key[1])
+
+    @contextmanager
+    def timed(self, name: str, **labels: str) -> Iterator[None]:
+        """
+        Observe how long the block takes, whether it succeeds or not.
+        """
+        pre = time.time()
+        try:
+            yield
+        finally:
+            self.observe(name, time.time() - pre, **labels)
+
+    def timed_iter(self, name: str, items: Iterable[T], **labels: str) -> Iterator[T]:
+        """
+        Yield the items, observing how long producing each of them takes.
+        """
+        iterator = iter(items)
+        while True:
+            pre = time.time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe(name, time.time() - pre, **labels)
+            yield item
+
+    def snapshot(self) -> Tuple[Dict[Tuple[str, Labels], Histogram], Dict[Tuple[str, Labels], int]]:
+        with self._lock:
+            return dict(self._histograms), dict(self._counters)
+
+    def flush(self) -> None:
+        for sink in self._sinks:
+            try:
+                sink.flush(self)
+            except OSError:
+                pass
+
+
+# Metrics of the whole process, see configure_metrics
+metrics = Metrics()
+atexit.register(metrics.flush)
+
+
+def create_sink(spec: str, target_dir: str) -> MetricsSink:
+    """
+    Build a sink from the metrics_sink profile option: 'prometheus[:path]', 'file[:path]' or
+    'statsd[:host[:port]]'. Files default to target/.
+    """
+    kind, _, arg = spec.partition(':')
+    if kind == 'prometheus':
+        return PrometheusTextfileSink(arg or os.path.join(target_dir, PROMETHEUS_FILE))
+    if kind == 'file':
+        return FileSink(arg or os.path.join(target_dir, JSONL_FILE))
+    if kind == 'statsd':
+        host, _, port = arg.partition(':')
+        return StatsdSink(host or 'localhost', int(port or 8125))
+    raise ValueError(
+        f'Invalid metrics_sink {spec!r}, expected prometheus[:path], file[:path] '
+        f'or statsd[:host[:port]]'
+    )
+
+
+def _prometheus_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def _statsd_name(name: str, labels: Labels) -> str:
+    return '.'.join([METRICS_PREFIX, name] + [str(value) for _, value in labels])
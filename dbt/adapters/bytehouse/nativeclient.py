@@ -16,93 +16,366 @@
    limitations under the License.
 """
 
+import queue
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
 import bytehouse_driver
-from dateutil import parser
 from bytehouse_driver import Client
 from bytehouse_driver.errors import NetworkError, SocketTimeoutError
+from dbt.events import AdapterLogger
 from dbt.exceptions import DatabaseException as DBTDatabaseException
 from dbt.version import __version__ as dbt_version
 
 from dbt.adapters.bytehouse import ByteHouseCredentials
-from dbt.adapters.bytehouse.dbclient import BhClientWrapper, BhRetryableException
+from dbt.adapters.bytehouse.dbclient import (
+    BhClientWrapper,
+    BhRetryableException,
+    is_prepared,
+    mark_prepared,
+    wait_for_warehouse,
+)
+from dbt.adapters.bytehouse.metadata import PLAIN_VIEW_TYPE, MetaColumn, parse_introspection_scope
+
+logger = AdapterLogger('bytehouse')
+
+system_meta_re = re.compile(r'\bsystem_meta\b')
+system_meta_name_re = re.compile(r'^system_meta_(\d+)_[0-9a-f]+$')
+# The statement may follow a query comment, and may name the table with or without IF EXISTS
+drop_table_re = re.compile(r'\bdrop\s+(table)\s+(?:if\s+exists\s+)?(\S+)', re.IGNORECASE)
+rename_table_re = re.compile(r'\brename\s+table\b', re.IGNORECASE)
+# Age after which a private system_meta database is assumed to belong to a dead process
+STALE_SYSTEM_META_SECONDS = 24 * 3600
+
+BULK_COLUMNS_SQL = (
+    'SELECT database, table, name, type, comment FROM system.columns '
+    'WHERE database IN ({databases}) ORDER BY database, table, position'
+)
+# Server errors meaning that system.columns or one of its columns does not exist:
+# NO_SUCH_COLUMN_IN_TABLE, UNKNOWN_IDENTIFIER and UNKNOWN_TABLE
+UNSUPPORTED_BULK_COLUMNS_CODES = (16, 47, 60)
 
 
 class BhNativeClient(BhClientWrapper):
+    # Whether the server answers BULK_COLUMNS_SQL, shared by every connection in the process
+    bulk_columns_supported = None
+    # Whether this process has looked for system_meta databases left behind by others
+    stale_system_meta_dropped = False
+
+    def __init__(self, credentials: ByteHouseCredentials):
+        # Private system_meta database of this connection, created on first use
+        self._system_meta = None
+        # Helper connections used to describe tables concurrently
+        self._helpers = []
+        # Id of the statement running on this connection, used to kill it on cancel
+        self.query_id = None
+        # Start of the query ids, naming the invocation and node for the query log
+        self.query_id_prefix = ''
+        super().__init__(credentials)
+
     def query(self, sql, **kwargs):
-        self.prepare_system_database(sql)
+        sql = self.prepare_system_database(sql)
         sql = self.rewrite_sql(sql)
+        statement = sql
         if "rename table" in sql:
             sql = self.get_rename_view_sql(sql)
         if "drop table" in sql or "DROP TABLE" in sql:
             sql = self.modify_drop_table_syntax(sql)
         try:
-            return NativeClientResult(self._client.execute(sql, with_column_types=True, **kwargs))
+            result = NativeClientResult(self._execute(sql, with_column_types=True, **kwargs))
         except bytehouse_driver.errors.Error as ex:
             raise DBTDatabaseException(str(ex).strip()) from ex
+        self._observe(statement)
+        return result
 
     def command(self, sql, **kwargs):
-        self.prepare_system_database(sql)
+        sql = self.prepare_system_database(sql)
         sql = self.rewrite_sql(sql)
+        statement = sql
         if "rename table" in sql:
             sql = self.get_rename_view_sql(sql)
         if "drop table" in sql or "DROP TABLE" in sql:
             sql = self.modify_drop_table_syntax(sql)
         try:
-            # TODO: Check whether Open source clickhouse support insertion without data block
-            if "ByteHouseCustomCSV" in sql:
-                query, data = self.handle_format_csv(sql)
-                result = self._client.execute(query, data, with_column_types=True, **kwargs)
-                return result
-            result = self._client.execute(sql, **kwargs)
-            if len(result) and len(result[0]):
-                return result[0][0]
+            result = self._execute(sql, **kwargs)
+        except bytehouse_driver.errors.Error as ex:
+            raise DBTDatabaseException(str(ex).strip()) from ex
+        self._observe(statement)
+        if len(result) and len(result[0]):
+            return result[0][0]
+
+    def insert(self, sql, columns):
+        sql = self.rewrite_sql(sql)
+        try:
+            return self._execute(sql, columns, columnar=True)
         except bytehouse_driver.errors.Error as ex:
             raise DBTDatabaseException(str(ex).strip()) from ex
 
+    def fetch(self, sql, settings=None):
+        try:
+            return self._execute(sql, settings=settings)
+        except bytehouse_driver.errors.Error as ex:
+            raise DBTDatabaseException(str(ex).strip()) from ex
+
+    def stream(self, sql, block_rows, settings=None):
+        sql = self.prepare_system_database(sql)
+        sql = self.rewrite_sql(sql)
+        self.query_id = self._new_query_id()
+        try:
+            rows = self._client.execute_iter(
+                sql, with_column_types=True, settings=settings, query_id=self.query_id
+            )
+            # The first item of the iterator holds the names and types of the columns
+            columns = next(rows, [])
+        except bytehouse_driver.errors.Error as ex:
+            self.query_id = None
+            raise DBTDatabaseException(str(ex).strip()) from ex
+        return NativeClientStream(columns, self._blocks(rows, block_rows))
+
+    def _blocks(self, rows, block_rows):
+        block = []
+        complete = False
+        try:
+            for row in rows:
+                block.append(row)
+                if len(block) >= block_rows:
+                    yield block
+                    block = []
+            complete = True
+        except bytehouse_driver.errors.Error as ex:
+            raise DBTDatabaseException(str(ex).strip()) from ex
+        finally:
+            self.query_id = None
+            if not complete:
+                # The rest of the result is still on the wire, dropping the connection discards it
+                self._client.disconnect()
+        if block:
+            yield block
+
+    def _execute(self, sql, *args, **kwargs):
+        # Tag the statement so that cancel() can find it on the server
+        self.query_id = self._new_query_id()
+        try:
+            return self._client.execute(sql, *args, query_id=self.query_id, **kwargs)
+        finally:
+            self.query_id = None
+
+    def _new_query_id(self):
+        return f'{self.query_id_prefix}{uuid.uuid4().hex}'
+
+    def query_statistics(self):
+        info = getattr(self._client, 'last_query', None)
+        if info is None:
+            return {}
+        progress = info.progress
+        statistics = {
+            'rows_read': progress.rows,
+            'bytes_read': progress.bytes,
+            'written_rows': progress.written_rows,
+            'written_bytes': progress.written_bytes,
+            'elapsed': round(info.elapsed, 3),
+        }
+        # Newer servers report their own elapsed time, without the network round trips
+        elapsed_ns = getattr(progress, 'elapsed_ns', 0)
+        if elapsed_ns:
+            statistics['elapsed'] = round(elapsed_ns / 1e9, 3)
+        if info.profile_info is not None:
+            statistics['result_rows'] = info.profile_info.rows
+        return statistics
+
+    def cancel(self, timeout):
+        query_id = self.query_id
+        # The socket still expects the reply of the killed statement, so it is never reused
+        self.discarded = True
+        try:
+            if query_id is None and not self._system_meta:
+                return True
+            # This connection is busy waiting for the statement, work from another one
+            client = _driver_client(self._credentials, {}, None)
+            try:
+                return self._kill(client, query_id, timeout)
+            finally:
+                self._drop_system_meta(client)
+                client.disconnect()
+        finally:
+            self._disconnect()
+
+    @staticmethod
+    def _kill(client, query_id, timeout):
+        if query_id is None:
+            return True
+        client.execute(f"KILL QUERY WHERE query_id = '{query_id}' ASYNC")
+        running_sql = f"SELECT count() FROM system.processes WHERE query_id = '{query_id}'"
+        deadline = time.time() + timeout
+        while client.execute(running_sql)[0][0]:
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.2)
+        return True
+
+    def _observe(self, sql):
+        self.relation_types.observe(sql, self.database)
+        if self.metadata is not None:
+            self.metadata.observe(sql, self.database)
+
     def close(self):
+        if self.discarded:
+            # Cancelled clients are already disconnected, with their system_meta dropped
+            return
+        self._drop_system_meta(self._client)
+        self._disconnect()
+
+    def _drop_system_meta(self, client):
+        if not self._system_meta:
+            return
+        try:
+            client.execute(f'DROP DATABASE IF EXISTS {self._system_meta}')
+        except bytehouse_driver.errors.Error as ex:
+            logger.debug(f'Could not drop {self._system_meta}: {ex}')
+
+    def _disconnect(self):
+        for helper in self._helpers:
+            helper.disconnect()
         self._client.disconnect()
 
-    def _create_client(self, credentials: ByteHouseCredentials):
-        client = bytehouse_driver.Client(
-            host=credentials.host,
-            port=credentials.port,
-            region=credentials.region,
-            account=credentials.account,
-            user=credentials.user,
-            password=credentials.password,
-            client_name=f'dbt-{dbt_version}',
-            secure=credentials.secure,
-            verify=credentials.verify,
-            connect_timeout=credentials.connect_timeout,
-            send_receive_timeout=credentials.send_receive_timeout,
-            sync_request_timeout=credentials.sync_request_timeout,
-            compress_block_size=credentials.compress_block_size,
-            compression=False if credentials.compression == '' else credentials.compression,
-            settings=self._conn_settings,
+    def is_healthy(self):
+        try:
+            return self._client.connection.ping()
+        except Exception:
+            return False
+
+    def harvest_columns(self, tables):
+        pre = time.time()
+        mode = 'system.columns'
+        columns = self._harvest_bulk(tables)
+        if columns is None:
+            mode = 'describe'
+            columns = self._harvest_describe(tables)
+        logger.debug(
+            f'Harvested columns of {len(tables)} tables with {mode} in '
+            f'{(time.time() - pre):.2f} seconds'
         )
+        return columns
+
+    def _harvest_bulk(self, tables):
+        if not tables or BhNativeClient.bulk_columns_supported is False:
+            return None
+        databases = ', '.join(f"'{database}'" for database in sorted({key[0] for key in tables}))
         try:
+            rows = self._execute(BULK_COLUMNS_SQL.format(databases=databases))
+        except bytehouse_driver.errors.Error as ex:
+            if getattr(ex, 'code', None) in UNSUPPORTED_BULK_COLUMNS_CODES:
+                logger.debug(f'Bulk column metadata is not available, using DESCRIBE: {ex}')
+                BhNativeClient.bulk_columns_supported = False
+            else:
+                # Timeouts and the like may not happen again, try the bulk query next time
+                logger.debug(f'Bulk column metadata failed, using DESCRIBE this time: {ex}')
+            return None
+        BhNativeClient.bulk_columns_supported = True
+        columns = {key: [] for key in tables}
+        for database, table, name, column_type, comment in rows:
+            table_columns = columns.get((database, table))
+            if table_columns is not None:
+                table_columns.append(MetaColumn(name, column_type, len(table_columns), comment))
+        return columns
+
+    def _harvest_describe(self, tables):
+        workers = min(self._metadata_threads, len(tables))
+        if workers <= 1:
+            return {key: self._describe(self._client, key) for key in tables}
+        while len(self._helpers) < workers:
+            self._helpers.append(self._create_client(self._credentials))
+        pool = queue.Queue()
+        for helper in self._helpers[:workers]:
+            pool.put(helper)
+
+        def describe(key):
+            helper = pool.get()
+            try:
+                return key, self._describe(helper, key)
+            finally:
+                pool.put(helper)
+
+        with ThreadPoolExecutor(max_workers=workers) as tpe:
+            return dict(tpe.map(describe, tables))
+
+    def _describe(self, client, key):
+        try:
+            # Helpers run concurrently, so their statements are not the one cancel() kills
+            rows = client.execute(
+                f'DESCRIBE TABLE {key[0]}.{key[1]}', query_id=self._new_query_id()
+            )
+        except bytehouse_driver.errors.Error as ex:
+            raise DBTDatabaseException(str(ex).strip()) from ex
+        return [MetaColumn(row[0], row[1], idx, row[4]) for idx, row in enumerate(rows)]
+
+    def _create_client(self, credentials: ByteHouseCredentials, database=None):
+        client = _driver_client(credentials, self._conn_settings, database)
+        try:
+            pre = time.time()
             client.connection.connect()
+            connected = time.time()
             if credentials.warehouse is not None and credentials.warehouse != "":
-                if self._is_warehouse_up(client, credentials.warehouse) is False:
-                    client.execute('resume warehouse {}'.format(credentials.warehouse))
+                # Whether the warehouse runs is checked once per process, possibly by the
+                # background warm-up, the session still has to select it
+                wait_for_warehouse(credentials)
+                if not is_prepared(credentials, 'warehouse', credentials.warehouse):
+                    if self._is_warehouse_up(client, credentials.warehouse) is False:
+                        client.execute('resume warehouse {}'.format(credentials.warehouse))
+                    mark_prepared(credentials, 'warehouse', credentials.warehouse)
                 client.execute('set warehouse {}'.format(credentials.warehouse))
+            logger.debug(
+                f'Connected in {(connected - pre) * 1000:.0f} ms, warehouse set up in '
+                f'{(time.time() - connected) * 1000:.0f} ms'
+            )
         except (SocketTimeoutError, NetworkError) as ex:
             raise BhRetryableException(str(ex)) from ex
         return client
 
-    def _is_warehouse_up(self, client: Client, vw_name):
+    @staticmethod
+    def _is_warehouse_up(client: Client, vw_name):
         warehouses = client.execute("show warehouses")
         for warehouse in warehouses:
             if warehouse[1] == vw_name and warehouse[6] == "up":
                 return True
         return False
 
+    @classmethod
+    def warm_warehouse(cls, credentials: ByteHouseCredentials) -> Client:
+        """
+        Connect, resume the warehouse if it is suspended and select it. Returns the connected
+        client, used to keep the warehouse alive afterwards.
+        """
+        client = _driver_client(credentials, {}, None)
+        if not cls._is_warehouse_up(client, credentials.warehouse):
+            logger.debug(f'Resuming warehouse {credentials.warehouse}')
+            client.execute('resume warehouse {}'.format(credentials.warehouse))
+        client.execute('set warehouse {}'.format(credentials.warehouse))
+        return client
+
+    @classmethod
+    def touch_warehouse(cls, client: Client, warehouse: str) -> None:
+        """
+        Run a trivial query on the warehouse so it does not auto-suspend, resuming it first
+        if it was suspended anyway.
+        """
+        if not cls._is_warehouse_up(client, warehouse):
+            logger.debug(f'Warehouse {warehouse} was suspended, resuming it')
+            client.execute('resume warehouse {}'.format(warehouse))
+            client.execute('set warehouse {}'.format(warehouse))
+        client.execute('SELECT 1')
+
     def _set_client_database(self):
         # After we know the database exists, reconnect to that database if appropriate
         if self._client.connection.database != self.database:
             self._client.connection.disconnect()
             self._client.connection.database = self.database
             self._client.connection.connect()
+            if self._credentials.warehouse:
+                # The new session has to select the warehouse again
+                self._client.execute('set warehouse {}'.format(self._credentials.warehouse))
 
     def _server_version(self):
         server_info = self._client.connection.server_info
@@ -111,57 +384,96 @@ class BhNativeClient(BhClientWrapper):
         )
 
     def prepare_system_database(self, sql):
+        """
+        Materialize the metadata a system_meta query reads into a database private to this
+        connection, so concurrent threads never rebuild each other's metadata, and return the
+        query rewritten to read from it.
+        """
         if "system_meta" not in sql:
-            return
+            return sql
+        if not self._system_meta:
+            self._drop_stale_system_meta()
+            # The creation time in the name lets a later process drop it if this one dies
+            self._system_meta = f'system_meta_{int(time.time())}_{uuid.uuid4().hex[:8]}'
+            self._execute(f"CREATE DATABASE IF NOT EXISTS {self._system_meta}")
+        system_meta = self._system_meta
         # TODO: Add log & exception handling
-        self._client.execute("DROP DATABASE IF EXISTS system_meta")
-        self._client.execute("CREATE DATABASE system_meta")
-        self._client.execute("CREATE TABLE system_meta.databases (name String, engine String, comment String) engine = CnchMergeTree("
-                             ") order by tuple()")
-        databases_result = self._client.execute("SHOW DATABASES")
+        for table in ('databases', 'tables', 'columns'):
+            self._execute(f"DROP TABLE IF EXISTS {system_meta}.{table}")
+        self._execute(
+            f"CREATE TABLE {system_meta}.databases (name String, engine String, comment String) "
+            "engine = CnchMergeTree() order by tuple()"
+        )
+        # Only load the schemas and table the query filters on, when it filters on any
+        schemas, table_name = parse_introspection_scope(sql)
+        databases_result = self._execute("SHOW DATABASES")
         databases_holder = []
         for database in databases_result:
             database_name = database[0]
-            if database_name.startswith("dbt"):
+            if database_name.startswith("dbt") or (schemas and database_name in schemas):
                 databases_holder.append(database)
         databases_result = databases_holder
         if len(databases_result) > 0:
-            self._client.execute("INSERT INTO system_meta.databases VALUES", ((x[0], x[8], x[7]) for x in databases_result))
+            self._execute(
+                f"INSERT INTO {system_meta}.databases VALUES",
+                ((x[0], x[8], x[7]) for x in databases_result),
+            )
+        if schemas is not None:
+            databases_result = [x for x in databases_result if x[0] in schemas]
 
         if "system_meta.tables" not in sql and "system_meta.columns" not in sql:
-            return
+            return system_meta_re.sub(system_meta, sql)
 
-        self._client.execute("CREATE TABLE system_meta.tables (name String, database String, engine String, comment "
-                             "String, type String) engine = CnchMergeTree() order by tuple()")
+        self._execute(
+            f"CREATE TABLE {system_meta}.tables (name String, database String, engine String, "
+            "comment String, type String) engine = CnchMergeTree() order by tuple()"
+        )
 
-        table_names = []
+        table_keys = []
+        tables_data = []
         for database in databases_result:
             database_name = database[0]
-            tables_result = self._client.execute(f"SHOW TABLES FROM {database_name}")
-            for table in tables_result:
-                table_name = table[0]
-                table_names.append(f'{database_name}.{table_name}')
-            if len(tables_result) > 0:
-                self._client.execute("INSERT INTO system_meta.tables VALUES",
-                                     ((x[0], database_name, "CnchMergeTree", x[7], x[8]) for x in tables_result))
+            for table in self._execute(f"SHOW TABLES FROM {database_name}"):
+                if table_name is not None and table[0] != table_name:
+                    continue
+                table_keys.append((database_name, table[0]))
+                tables_data.append((table[0], database_name, "CnchMergeTree", table[7], table[8]))
+        if len(tables_data) > 0:
+            self._execute(f"INSERT INTO {system_meta}.tables VALUES", tables_data)
 
         if "system_meta.columns" not in sql:
-            return
+            return system_meta_re.sub(system_meta, sql)
 
-        self._client.execute("CREATE TABLE system_meta.columns (database String, table String, name String, position "
-                             "Int, type String, comment String) engine = CnchMergeTree() order by tuple()")
-        for table_name in table_names:
-            database_identifier = table_name.split(".")[0]
-            table_identifier = table_name.split(".")[1]
-            columns_result = self._client.execute(f"DESCRIBE TABLE {table_name}")
-            # TODO: Verify ordering is the same as index
-            columns_data = []
-            idx = 0
-            for x in columns_result:
-                columns_data.append([database_identifier, table_identifier, x[0], idx, x[1], x[4]])
-                idx = idx + 1
-            if len(columns_result) > 0:
-                self._client.execute("INSERT INTO system_meta.columns VALUES", columns_data)
+        self._execute(
+            f"CREATE TABLE {system_meta}.columns (database String, table String, name String, "
+            "position Int, type String, comment String) engine = CnchMergeTree() order by tuple()"
+        )
+        columns_data = []
+        for key, columns in self.harvest_columns(table_keys).items():
+            for column in columns:
+                columns_data.append(
+                    [key[0], key[1], column.name, column.position, column.type, column.comment]
+                )
+        if len(columns_data) > 0:
+            self._execute(f"INSERT INTO {system_meta}.columns VALUES", columns_data)
+        return system_meta_re.sub(system_meta, sql)
+
+    def _drop_stale_system_meta(self):
+        """
+        Drop the system_meta databases that processes which did not exit cleanly left behind,
+        once per process.
+        """
+        if BhNativeClient.stale_system_meta_dropped:
+            return
+        BhNativeClient.stale_system_meta_dropped = True
+        deadline = time.time() - STALE_SYSTEM_META_SECONDS
+        for database in self._execute('SHOW DATABASES'):
+            match = system_meta_name_re.match(database[0])
+            if match and int(match.group(1)) < deadline:
+                try:
+                    self._execute(f'DROP DATABASE IF EXISTS {database[0]}')
+                except bytehouse_driver.errors.Error as ex:
+                    logger.debug(f'Could not drop stale {database[0]}: {ex}')
 
     def rewrite_sql(self, sql):
         # TODO: Engine rewrite from upstream caller
@@ -172,97 +484,76 @@ class BhNativeClient(BhClientWrapper):
 
     def get_rename_view_sql(self, sql):
         sql = self.modify_rename_table_syntax(sql)
-        tokens = sql.split(" ")
+        tokens = sql.split()
         old_identifier = tokens[2]
         new_identifier = tokens[4]
         if not self.is_view(old_identifier):
             return sql
-        old_view_create_table = self._client.execute(f'SHOW CREATE TABLE {old_identifier}')[0][0]
+        old_view_create_table = self._execute(f'SHOW CREATE TABLE {old_identifier}')[0][0]
         tokens = old_view_create_table.split(" ")
         tokens[2] = new_identifier
         new_view_create_table = ' '.join(tokens)
 
-        self._client.execute(f'DROP VIEW IF EXISTS {old_identifier}')
+        self._execute(f'DROP VIEW IF EXISTS {old_identifier}')
         return new_view_create_table
 
     def modify_drop_table_syntax(self, sql):
-        tokens = sql.split(" ")
-        table_identifier = ""
-        for iter in range(0, len(tokens)-1):
-            if tokens[iter].upper().endswith("DROP") and tokens[iter+1].upper() == "TABLE":
-                table_identifier = tokens[iter+4]
-                break
-        if not self.is_view(table_identifier):
+        match = drop_table_re.search(sql)
+        if match is None or not self.is_view(match.group(2)):
             return sql
-        for iter in range(0, len(tokens)-1):
-            if tokens[iter].upper().endswith("DROP") and tokens[iter+1].upper() == "TABLE":
-                tokens[iter+1] = "view"
-                break
-        return ' '.join(tokens)
+        return f'{sql[:match.start(1)]}view{sql[match.end(1):]}'
 
     def is_view(self, identifier):
-        tokens = identifier.split(".")
-        database_name = tokens[0]
-        table_name = tokens[1]
-
-        table_results = self._client.execute(f'SHOW TABLES FROM {database_name}')
-        for table in table_results:
-            name = table[0]
-            table_type = table[8]
-            if name == table_name and table_type == "VIEW":
-                return True
-        return False
+        tokens = identifier.replace('`', '').replace('"', '').split(".")
+        database_name = tokens[0] if len(tokens) > 1 else self.database
+        table_name = tokens[-1]
+
+        cached = self.relation_types.is_view(database_name, table_name)
+        if cached is not None:
+            return cached
+        table_results = self._execute(f'SHOW TABLES FROM {database_name}')
+        views = {table[0]: table[8] == PLAIN_VIEW_TYPE for table in table_results}
+        self.relation_types.remember_listing(database_name, views)
+        return views.get(table_name, False)
 
     def modify_rename_table_syntax(self, sql):
-        tokens = sql.split(" ")
-        modify_sql = ""
-        st = False
-        for token in tokens:
-            if token == "rename":
-                st = True
-            if st:
-                modify_sql += token
-                modify_sql += " "
-        return modify_sql
-
-    def handle_format_csv(self, sql):
-        tokens = sql.split("|")
-
-        insert_query = tokens[1]
-        column_count = int(tokens[3])
-
-        datatypes = []
-        for i in range(4, 4 + column_count):
-            datatypes.append(tokens[i])
-
-        # TODO: Support all datatypes
-        data = []
-        for i in range(4 + column_count, len(tokens), column_count):
-            row = []
-            idx = 0
-            for j in range(i, i + column_count):
-                val = tokens[j]
-                if datatypes[idx] == "String":
-                    val = str(val)
-                if datatypes[idx] == "Datetime":
-                    val = parser.parse(val)
-                if datatypes[idx] == "Int":
-                    if str(val) == 'None':
-                        val = 0
-                    val = int(val)
-                if datatypes[idx] == "BooleanInt":
-                    cur = str(val).upper()
-                    if cur == "TRUE":
-                        val = 1
-                    else:
-                        val = 0
-                row.append(val)
-                idx += 1
-            data.append(row)
-        return insert_query, data
+        # Drop the query comment and anything else before the statement itself
+        match = rename_table_re.search(sql)
+        return sql[match.start() :] if match else sql
 
 
 class NativeClientResult:
     def __init__(self, native_result):
         self.result_set = native_result[0]
-        self.column_names = [col[0] for col in native_result[1]]
\ No newline at end of file
+        self.column_names = [col[0] for col in native_result[1]]
+        self.column_types = [col[1] for col in native_result[1]]
+
+
+class NativeClientStream:
+    def __init__(self, columns, blocks):
+        self.column_names = [col[0] for col in columns]
+        self.column_types = [col[1] for col in columns]
+        self.blocks = blocks
+
+
+def _driver_client(credentials: ByteHouseCredentials, settings, database):
+    # Without a database the driver connects to its default one
+    options = {} if database is None else {'database': database}
+    return bytehouse_driver.Client(
+        host=credentials.host,
+        port=credentials.port,
+        region=credentials.region,
+        account=credentials.account,
+        user=credentials.user,
+        password=credentials.password,
+        client_name=f'dbt-{dbt_version}',
+        secure=credentials.secure,
+        verify=credentials.verify,
+        connect_timeout=credentials.connect_timeout,
+        send_receive_timeout=credentials.send_receive_timeout,
+        sync_request_timeout=credentials.sync_request_timeout,
+        compress_block_size=credentials.compress_block_size,
+        compression=False if credentials.compression == '' else credentials.compression,
+        settings=settings,
+        **options,
+    )
@@ -0,0 +1,204 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import atexit
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# Set to 'cpu' (or any other value) to profile each node, 'cpu,memory' to trace allocations too
+PROFILE_ENV = 'DBT_BYTEHOUSE_PROFILE'
+PROFILE_DIR = 'bytehouse_profiles'
+COLLAPSED_FILE = 'collapsed_stacks.txt'
+SUMMARY_FILE = 'summary.json'
+# Seconds between two stack samples of the threads running nodes
+SAMPLE_INTERVAL = 0.005
+TOP_ALLOCATIONS = 10
+
+_unsafe_name_re = re.compile(r'[^\w.-]+')
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    label = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+    # Semicolons separate the frames of a collapsed stack
+    return label.replace(';', ':')
+
+
+def collapse_stack(frame) -> str:
+    """
+    Render a stack as the frames from the outermost to `frame`, joined with semicolons, as
+    flamegraph.pl and speedscope read them.
+    """
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class Profiler:
+    """
+    Profiles what each thread does while it runs a node: deterministically with cProfile,
+    by sampling the thread's stack for a merged flame graph, and with memory set by
+    tracing the allocations made meanwhile. Nodes running concurrently share the process
+    heap, so memory is attributed approximately.
+    """
+
+    def __init__(self, directory: str, memory: bool = False):
+        self.directory = directory
+        self.memory = memory
+        self._profiles: Dict[str, List[cProfile.Profile]] = {}
+        self._summary: Dict[str, Dict] = {}
+        self._stacks: Counter = Counter()
+        # Node run by each thread being profiled, by thread id
+        self._active: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._sampler = threading.Thread(
+            target=self._sample, name='bytehouse-profiler', daemon=True
+        )
+        self._sampler.start()
+
+    @contextmanager
+    def node(self, name: str) -> Iterator[None]:
+        """
+        Profile the block as part of node `name`. Nested blocks of the same thread count
+        towards the outermost node.
+        """
+        ident = threading.get_ident()
+        with self._lock:
+            if ident in self._active:
+                nested = True
+            else:
+                nested = False
+                self._active[ident] = name
+        if nested:
+            yield
+            return
+        profile: Optional[cProfile.Profile] = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Only one cProfile can run at a time on newer Pythons, samples are still taken
+            profile = None
+        snapshot = tracemalloc.take_snapshot() if self.memory else None
+        traced = tracemalloc.get_traced_memory()[0] if self.memory else 0
+        pre = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - pre
+            if profile is not None:
+                profile.disable()
+            with self._lock:
+                del self._active[ident]
+            self._record(name, elapsed, profile, snapshot, traced)
+
+    def _record(self, name, elapsed, profile, snapshot, traced) -> None:
+        allocations = []
+        if snapshot is not None:
+            traced = tracemalloc.get_traced_memory()[0] - traced
+            growth = tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')
+            allocations = [str(stat) for stat in growth[:TOP_ALLOCATIONS]]
+        with self._lock:
+            summary = self._summary.setdefault(name, {'calls': 0, 'seconds': 0.0})
+            summary['calls'] += 1
+            summary['seconds'] = round(summary['seconds'] + elapsed, 6)
+            if snapshot is not None:
+                summary['memory_delta'] = summary.get('memory_delta', 0) + traced
+                summary['top_allocations'] = allocations
+            if profile is not None:
+                self._profiles.setdefault(name, []).append(profile)
+
+    def _sample(self) -> None:
+        while not self._stopping.wait(SAMPLE_INTERVAL):
+            frames = sys._current_frames()
+            with self._lock:
+                active = list(self._active.items())
+            for ident, name in active:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self._stacks[f'{name};{collapse_stack(frame)}'] += 1
+
+    def write(self) -> None:
+        """
+        Stop sampling and write, under the profiler's directory, a cProfile file per node, the
+        collapsed stacks of all nodes and a summary of time and memory per node.
+        """
+        self._stopping.set()
+        self._sampler.join()
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            profiles = dict(self._profiles)
+            summary = dict(self._summary)
+            stacks = sorted(self._stacks.items())
+        for name, node_profiles in profiles.items():
+            stats = pstats.Stats(node_profiles[0])
+            for profile in node_profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(os.path.join(self.directory, f'{_unsafe_name_re.sub("_", name)}.prof'))
+        with open(os.path.join(self.directory, COLLAPSED_FILE), 'w') as f:
+            for stack, count in stacks:
+                f.write(f'{stack} {count}\n')
+        with open(os.path.join(self.directory, SUMMARY_FILE), 'w') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+
+
+_profiler: Optional[Profiler] = None
+_profiler_lock = threading.Lock()
+
+
+def start_profiler(target_dir: str) -> Optional[Profiler]:
+    """
+    Start the process-wide profiler when PROFILE_ENV is set, writing to PROFILE_DIR under
+    target_dir when the process exits.
+    """
+    global _profiler
+    mode = os.environ.get(PROFILE_ENV, '')
+    if not mode:
+        return None
+    with _profiler_lock:
+        if _profiler is None:
+            memory = 'memory' in {part.strip().lower() for part in mode.split(',')}
+            _profiler = Profiler(os.path.join(target_dir, PROFILE_DIR), memory)
+            atexit.register(_profiler.write)
+        return _profiler
+
+
+@contextmanager
+def profiled(name: str) -> Iterator[None]:
+    """
+    Profile the block as part of node `name` when profiling is on.
+    """
+    if _profiler is None:
+        yield
+    else:
+        with _profiler.node(name):
+            yield
@@ -0,0 +1,176 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import importlib
+import json
+import re
+from typing import Any, List, Sequence
+
+import agate
+import dbt.utils
+from dbt.clients.agate_helper import Number
+
+from dbt.adapters.bytehouse.seeds import unwrap_type
+
+# Formats of columnar results, see columns_to_result
+RESULT_FORMATS = ('columns', 'numpy', 'arrow')
+_decimal_re = re.compile(r'^Decimal\((\d+),\s*(\d+)\)$')
+_NUMERIC_TYPES = {
+    'Int8',
+    'Int16',
+    'Int32',
+    'Int64',
+    'UInt8',
+    'UInt16',
+    'UInt32',
+    'UInt64',
+    'Float32',
+    'Float64',
+}
+_JSON_PREFIXES = ('Array', 'Map', 'Tuple', 'Nested', 'Object', 'JSON')
+_NUMBER_PREFIXES = ('Int', 'UInt', 'Float', 'Decimal')
+
+# Values arrive typed from the driver, so no text is ever turned into NULL
+_AGATE_TYPES = {
+    'text': agate.data_types.Text(null_values=()),
+    'json': agate.data_types.Text(null_values=()),
+    'number': Number(null_values=()),
+    'boolean': agate.data_types.Boolean(null_values=()),
+    'date': agate.data_types.Date(null_values=()),
+    'datetime': agate.data_types.DateTime(null_values=()),
+}
+
+
+def column_kind(column_type: str) -> str:
+    """
+    Classify a ByteHouse column type as text, json, number, boolean, date or datetime.
+    Containers are kept as json text, like dbt does for results it has to infer.
+    """
+    base_type, _ = unwrap_type(column_type)
+    if base_type.startswith(_JSON_PREFIXES):
+        return 'json'
+    if base_type.startswith(_NUMBER_PREFIXES):
+        return 'number'
+    if base_type.startswith('DateTime'):
+        return 'datetime'
+    if base_type.startswith('Date'):
+        return 'date'
+    if base_type in ('Bool', 'Boolean'):
+        return 'boolean'
+    return 'text'
+
+
+def table_from_result(
+    rows: Sequence[tuple], column_names: List[str], column_types: List[str]
+) -> agate.Table:
+    """
+    Build an agate table from driver rows using the column types reported by the server,
+    instead of inferring them value by value.
+    """
+    kinds = [column_kind(column_type) for column_type in column_types]
+    json_columns = [idx for idx, kind in enumerate(kinds) if kind == 'json']
+    if json_columns:
+        rows = [list(row) for row in rows]
+        for row in rows:
+            for idx in json_columns:
+                if row[idx] is not None:
+                    row[idx] = json.dumps(row[idx], cls=dbt.utils.JSONEncoder)
+    return agate.Table(rows, column_names, [_AGATE_TYPES[kind] for kind in kinds])
+
+
+def columns_to_result(
+    columns: Sequence[Sequence[Any]],
+    column_names: List[str],
+    column_types: List[str],
+    result_format: str,
+) -> Any:
+    """
+    Convert a columnar driver result to the requested format, one conversion per column:
+    'columns' maps names to the driver's value sequences, 'numpy' maps names to arrays with
+    a native dtype where the ByteHouse type allows it, 'arrow' returns a pyarrow.Table.
+    """
+    check_result_format(result_format)
+    if not columns:
+        # The driver returns no columns at all for an empty result
+        columns = [[] for _ in column_names]
+    if result_format == 'columns':
+        return dict(zip(column_names, columns))
+    if result_format == 'numpy':
+        numpy = _require('numpy')
+        return {
+            name: _numpy_column(numpy, values, column_type)
+            for name, values, column_type in zip(column_names, columns, column_types)
+        }
+    pyarrow = _require('pyarrow')
+    arrays = [
+        pyarrow.array(values, type=_arrow_type(pyarrow, column_type))
+        for values, column_type in zip(columns, column_types)
+    ]
+    return pyarrow.Table.from_arrays(arrays, names=column_names)
+
+
+def check_result_format(result_format: str) -> None:
+    """
+    Raise ValueError for an unknown result format, or one whose package is not installed.
+    """
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(
+            f'Invalid result_format {result_format!r}, expected one of {", ".join(RESULT_FORMATS)}'
+        )
+    if result_format != 'columns':
+        _require(result_format if result_format == 'numpy' else 'pyarrow')
+
+
+def _require(module: str):
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise ValueError(
+            f'{module} is required for this result_format, install dbt-bytehouse[arrow]'
+        ) from None
+
+
+def _numpy_column(numpy, values: Sequence[Any], column_type: str):
+    base_type, nullable = unwrap_type(column_type)
+    if not nullable and (base_type in _NUMERIC_TYPES or base_type == 'Bool'):
+        return numpy.array(values, dtype=base_type.lower())
+    array = numpy.empty(len(values), dtype=object)
+    if column_kind(column_type) == 'json':
+        # Assigning all at once would turn nested values into extra dimensions
+        for idx, value in enumerate(values):
+            array[idx] = value
+    else:
+        array[:] = values
+    return array
+
+
+def _arrow_type(pyarrow, column_type: str):
+    base_type, _ = unwrap_type(column_type)
+    if base_type in _NUMERIC_TYPES:
+        return getattr(pyarrow, base_type.lower())()
+    if base_type == 'Bool':
+        return pyarrow.bool_()
+    if base_type == 'String':
+        return pyarrow.string()
+    if base_type == 'Date':
+        return pyarrow.date32()
+    match = _decimal_re.match(base_type)
+    if match and int(match.group(1)) <= 38:
+        return pyarrow.decimal128(int(match.group(1)), int(match.group(2)))
+    # Let pyarrow infer the others from the values
+    return None
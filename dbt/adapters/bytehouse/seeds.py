@@ -0,0 +1,428 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import array
+import csv
+import datetime
+import decimal
+import hashlib
+import json
+import re
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from dateutil import parser
+
+_wrapper_re = re.compile(r'^(Nullable|LowCardinality)\((.*)\)$')
+_size_re = re.compile(r'^\s*(\d+)\s*([KMG]?)B\s*$', re.IGNORECASE)
+_SIZE_UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+# Rows sampled to estimate the row size when batch_size is given in bytes
+_SAMPLE_ROWS = 1000
+# Bytes of raw CSV sent per statement in passthrough mode unless batch_size is given in bytes.
+# The chunk travels as a string literal the server parses with the statement, so keep it small.
+CSV_CHUNK_BYTES = 4 << 20
+# Non-empty values agate reads as NULL, whatever their case, see agate's DEFAULT_NULL_VALUES
+AGATE_NULL_TOKENS = frozenset(('na', 'n/a', 'none', 'null', '.'))
+# Stands for the quoted CSV text in passthrough insert statements
+CSV_DATA_PLACEHOLDER = '__bytehouse_csv_data__'
+# Marks the seed fingerprint kept in the table comment
+SEED_FINGERPRINT_PREFIX = 'dbt-seed-fingerprint:'
+# Seed configs that change the table a seed is loaded into
+SEED_FINGERPRINT_CONFIGS = (
+    'column_types',
+    'compact_types',
+    'quote_columns',
+    'engine',
+    'order_by',
+    'partition_by',
+    'settings',
+    'delta_load',
+)
+# Column holding the hash of every row in tables of seeds loaded with delta_load
+ROW_HASH_COLUMN = '_dbt_row_hash'
+ROW_HASH_TYPE = 'UInt64'
+
+
+def unwrap_type(column_type: str) -> Tuple[str, bool]:
+    """
+    Strip Nullable and LowCardinality wrappers, returning the base type and whether it is
+    nullable.
+    """
+    nullable = False
+    column_type = column_type.strip()
+    match = _wrapper_re.match(column_type)
+    while match:
+        nullable = nullable or match.group(1) == 'Nullable'
+        column_type = match.group(2).strip()
+        match = _wrapper_re.match(column_type)
+    return column_type, nullable
+
+
+def _to_int(value):
+    if isinstance(value, str):
+        value = value.strip()
+        if value.upper() in ('TRUE', 'FALSE'):
+            return int(value.upper() == 'TRUE')
+        return int(decimal.Decimal(value))
+    return int(value)
+
+
+def _to_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return parser.parse(str(value)).date()
+
+
+def _to_datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    return parser.parse(str(value))
+
+
+# Converter and value used for NULL cells in non nullable columns, by base type prefix
+_CONVERTERS: List[Tuple[str, Callable[[Any], Any], Any]] = [
+    ('UInt', _to_int, 0),
+    ('Int', _to_int, 0),
+    ('Float', float, 0.0),
+    ('Decimal', lambda value: decimal.Decimal(str(value)), decimal.Decimal(0)),
+    ('Bool', lambda value: str(value).upper() in ('TRUE', '1'), False),
+    ('DateTime', _to_datetime, datetime.datetime(1970, 1, 1)),
+    ('Date', _to_date, datetime.date(1970, 1, 1)),
+    ('String', str, ''),
+    ('FixedString', str, ''),
+]
+
+
+# Smallest integer types first, with their range and array typecode for size estimates
+_INT_TYPES = [
+    ('UInt8', 0, (1 << 8) - 1, 'B'),
+    ('Int8', -(1 << 7), (1 << 7) - 1, 'b'),
+    ('UInt16', 0, (1 << 16) - 1, 'H'),
+    ('Int16', -(1 << 15), (1 << 15) - 1, 'h'),
+    ('UInt32', 0, (1 << 32) - 1, 'I'),
+    ('Int32', -(1 << 31), (1 << 31) - 1, 'i'),
+    ('UInt64', 0, (1 << 64) - 1, 'Q'),
+    ('Int64', -(1 << 63), (1 << 63) - 1, 'q'),
+]
+# Text columns with at most this many distinct values, and at most half as many distinct values
+# as rows, become LowCardinality
+LOW_CARDINALITY_MAX = 10000
+# Decimals wider than this are stored as Float64
+DECIMAL_MAX_PRECISION = 18
+# Values per column compressed to estimate the compression ratio
+_ESTIMATE_SAMPLE = 10000
+
+
+@dataclass
+class InferredColumn:
+    type: str
+    raw_bytes: int
+    compressed_bytes: int
+
+
+def infer_seed_types(agate_table) -> List[InferredColumn]:
+    """
+    Choose the narrowest ByteHouse type for every column of a seed, together with an estimate of
+    its stored size. Each column is scanned once, with the heavy lifting done by builtins.
+    """
+    rows = len(agate_table.rows)
+    return [_infer_column(column, rows) for column in agate_table.columns]
+
+
+def _infer_column(column, rows: int) -> InferredColumn:
+    kinds = {cls.__name__ for cls in type(column.data_type).__mro__}
+    values = [value for value in column.values() if value is not None]
+    sample = values[:_ESTIMATE_SAMPLE]
+    nullable = len(values) < rows
+    if 'Boolean' in kinds:
+        base, width, encoded = 'UInt8', 1, array.array('B', [int(value) for value in sample])
+    elif 'Number' in kinds:
+        base, width, encoded = _infer_number(values, sample)
+    elif 'DateTime' in kinds:
+        fractional = any(value.microsecond for value in values)
+        base, width = ('DateTime64(3)', 8) if fractional else ('DateTime', 4)
+        encoded = array.array('q', [int(value.timestamp()) for value in sample])
+    elif 'Date' in kinds:
+        base, width = 'Date', 2
+        encoded = array.array('q', [value.toordinal() for value in sample])
+    else:
+        return _infer_text([str(value) for value in values], rows, nullable)
+    column_type = f'Nullable({base})' if nullable else base
+    raw = rows * width + (rows if nullable else 0)
+    return InferredColumn(column_type, raw, _estimate(encoded.tobytes(), raw))
+
+
+def _infer_number(values: list, sample: list) -> Tuple[str, int, array.array]:
+    if not values:
+        return 'UInt8', 1, array.array('B')
+    if not all(value.is_finite() for value in values):
+        # NaN and infinities have no integer or decimal representation
+        return 'Float64', 8, array.array('d', [float(value) for value in sample])
+    exponents = [value.as_tuple().exponent for value in values]
+    if min(exponents) >= 0 or all(value == value.to_integral_value() for value in values):
+        low, high = int(min(values)), int(max(values))
+        for name, type_low, type_high, code in _INT_TYPES:
+            if type_low <= low and high <= type_high:
+                encoded = array.array(code, [int(value) for value in sample])
+                return name, encoded.itemsize, encoded
+        return 'Decimal(38, 0)', 16, array.array('d', [float(value) for value in sample])
+    scale = -min(exponents)
+    precision = len(str(int(max(abs(value) for value in values)))) + scale
+    encoded = array.array('d', [float(value) for value in sample])
+    if precision <= DECIMAL_MAX_PRECISION:
+        return f'Decimal({precision}, {scale})', 4 if precision <= 9 else 8, encoded
+    return 'Float64', 8, encoded
+
+
+def _infer_text(values: List[str], rows: int, nullable: bool) -> InferredColumn:
+    distinct = set(values)
+    text = '\n'.join(values[:_ESTIMATE_SAMPLE]).encode('utf-8')
+    base = 'Nullable(String)' if nullable else 'String'
+    if len(distinct) <= LOW_CARDINALITY_MAX and len(distinct) * 2 <= rows:
+        positions = {value: idx for idx, value in enumerate(distinct)}
+        code = 'B' if len(distinct) < 256 else 'H'
+        indexes = array.array(code, [positions[value] for value in values[:_ESTIMATE_SAMPLE]])
+        raw = rows * indexes.itemsize + sum(len(value) + 1 for value in distinct)
+        return InferredColumn(f'LowCardinality({base})', raw, _estimate(indexes.tobytes(), raw))
+    raw = sum(len(value) + 1 for value in values) + (rows if nullable else 0)
+    return InferredColumn(base, raw, _estimate(text, raw))
+
+
+def _estimate(sample: bytes, raw: int) -> int:
+    if not sample:
+        return raw
+    return int(raw * len(zlib.compress(sample)) / len(sample))
+
+
+def column_converter(column_type: str) -> Callable[[Any], Any]:
+    """
+    Return a function converting seed values to the Python type the native driver expects for
+    a ByteHouse column type.
+    """
+    base_type, nullable = unwrap_type(column_type)
+    for prefix, convert, default in _CONVERTERS:
+        if base_type.startswith(prefix):
+            break
+    else:
+        return lambda value: value
+
+    if nullable:
+        return lambda value: None if value is None else convert(value)
+    return lambda value: default if value is None else convert(value)
+
+
+def seed_columns(agate_table, column_types: Sequence[str]) -> List[list]:
+    """
+    Convert an agate table to one list of typed values per column, ready for a columnar insert.
+    """
+    return [
+        [convert(value) for value in column.values()]
+        for convert, column in zip(map(column_converter, column_types), agate_table.columns)
+    ]
+
+
+def batch_rows(batch_size: Union[int, str, None], agate_table) -> Optional[int]:
+    """
+    Translate a batch_size seed config into a number of rows. An integer is a row count, a
+    string such as '64MB' is a byte budget divided by the average size of a sample of rows.
+    """
+    if batch_size is None:
+        return None
+    if isinstance(batch_size, int):
+        return max(1, batch_size)
+    budget = parse_size(batch_size)
+    sample = agate_table.rows[:_SAMPLE_ROWS]
+    if not sample:
+        return None
+    row_bytes = sum(len(str(value)) + 1 for row in sample for value in row) / len(sample)
+    return max(1, int(budget / max(row_bytes, 1)))
+
+
+def parse_size(size: str) -> int:
+    """
+    Parse a byte size such as '512KB' or '64MB'.
+    """
+    match = _size_re.match(str(size))
+    if not match:
+        raise ValueError(f'Invalid batch_size {size!r}, expected rows or a size like 64MB')
+    return int(match.group(1)) * _SIZE_UNITS[match.group(2).upper()]
+
+
+def iter_seed_chunks(
+    agate_table, column_types: Sequence[str], rows_per_chunk: int
+) -> Iterator[List[list]]:
+    """
+    Yield the seed as typed column blocks of at most rows_per_chunk rows, converting each chunk
+    only when it is requested.
+    """
+    converters = [column_converter(column_type) for column_type in column_types]
+    values = [column.values() for column in agate_table.columns]
+    for start in range(0, len(agate_table.rows), rows_per_chunk):
+        yield [
+            [convert(value) for value in column[start : start + rows_per_chunk]]
+            for convert, column in zip(converters, values)
+        ]
+
+
+def needs_client_conversion(
+    agate_table, column_types: Sequence[str], path: Optional[str] = None
+) -> bool:
+    """
+    Whether some values of the seed only load correctly after conversion in Python, because
+    the server would parse the raw CSV text differently. Booleans are written as true/false
+    in CSV but stored in integer columns, and agate reads tokens such as `null` or `n/a` as
+    NULL where the server keeps the text. Columns holding NULLs are looked up in the seed file
+    at `path` for those tokens; empty values load the same both ways.
+    """
+    null_columns = []
+    for idx, (column, column_type) in enumerate(zip(agate_table.columns, column_types)):
+        base_type, _ = unwrap_type(column_type)
+        if type(column.data_type).__name__ == 'Boolean' and not base_type.startswith('Bool'):
+            return True
+        if None in column.values():
+            null_columns.append(idx)
+    if not null_columns or path is None:
+        return False
+    with open(path, newline='', encoding='utf-8') as csv_file:
+        reader = csv.reader(csv_file)
+        next(reader, None)
+        for row in reader:
+            for idx in null_columns:
+                if idx < len(row) and row[idx].strip().lower() in AGATE_NULL_TOKENS:
+                    return True
+    return False
+
+
+def csv_structure(column_names: Sequence[str], column_types: Sequence[str]) -> str:
+    return ', '.join(
+        f'`{name}` {column_type}' for name, column_type in zip(column_names, column_types)
+    )
+
+
+def quote_string(value: str) -> str:
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def iter_csv_chunks(path: str, chunk_bytes: int) -> Iterator[str]:
+    """
+    Yield the data rows of a CSV file as raw text of roughly chunk_bytes each, without the
+    header. Chunks only end on a line break outside quoted values, so a chunk never splits a
+    record.
+    """
+    with open(path, 'rb') as csv_file:
+        csv_file.readline()
+        pending = b''
+        while True:
+            block = csv_file.read(chunk_bytes)
+            if not block:
+                break
+            pending += block
+            end = _record_boundary(pending)
+            if end:
+                yield pending[:end].decode('utf-8')
+                pending = pending[end:]
+        if pending.strip():
+            yield pending.decode('utf-8')
+
+
+def _record_boundary(data: bytes) -> int:
+    end = data.rfind(b'\n')
+    while end >= 0:
+        # An even number of quotes before the line break means it is not inside a value
+        if data.count(b'"', 0, end) % 2 == 0:
+            return end + 1
+        end = data.rfind(b'\n', 0, end)
+    return 0
+
+
+def seed_fingerprint(path: str, config: dict) -> str:
+    """
+    Hash the seed file together with the configs shaping its table, so that a table still
+    holding the same fingerprint can be left as it is.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as seed_file:
+        for block in iter(lambda: seed_file.read(1 << 20), b''):
+            digest.update(block)
+    shaping = {key: config.get(key) for key in SEED_FINGERPRINT_CONFIGS}
+    digest.update(json.dumps(shaping, sort_keys=True, default=str).encode('utf-8'))
+    return SEED_FINGERPRINT_PREFIX + digest.hexdigest()
+
+
+def row_hashes(agate_table) -> List[int]:
+    """
+    Hash the values of every seed row to an unsigned 64 bit integer, used to tell which rows
+    of a delta loaded seed are already in its table.
+    """
+    return [
+        int.from_bytes(
+            hashlib.blake2b(
+                '\x1f'.join('\x00' if value is None else str(value) for value in row).encode(),
+                digest_size=8,
+            ).digest(),
+            'big',
+        )
+        for row in agate_table.rows
+    ]
+
+
+def diff_row_hashes(hashes: Sequence[int], stored: Iterable[int]) -> Tuple[List[int], List[int]]:
+    """
+    Compare the row hashes of a seed with the hashes stored in its table. Returns the indexes
+    of the seed rows to insert and the hashes to remove from the table. A row that now appears
+    fewer times than in the table is removed and inserted again as many times as needed.
+    """
+    wanted = Counter(hashes)
+    present = Counter(stored)
+    removed = [row_hash for row_hash, count in present.items() if wanted[row_hash] < count]
+    for row_hash in removed:
+        del present[row_hash]
+    missing = wanted - present
+    indexes = []
+    for idx, row_hash in enumerate(hashes):
+        if missing[row_hash] > 0:
+            missing[row_hash] -= 1
+            indexes.append(idx)
+    return indexes, removed
+
+
+def iter_delta_chunks(
+    agate_table,
+    column_types: Sequence[str],
+    indexes: Sequence[int],
+    hashes: Sequence[int],
+    rows_per_chunk: int,
+) -> Iterator[List[list]]:
+    """
+    Yield the seed rows at `indexes` as typed column blocks of at most rows_per_chunk rows,
+    followed by a column with their hashes.
+    """
+    converters = [column_converter(column_type) for column_type in column_types]
+    values = [column.values() for column in agate_table.columns]
+    for start in range(0, len(indexes), rows_per_chunk):
+        chunk = indexes[start : start + rows_per_chunk]
+        columns = [
+            [convert(column[idx]) for idx in chunk] for convert, column in zip(converters, values)
+        ]
+        yield columns + [[hashes[idx] for idx in chunk]]
@@ -16,20 +16,57 @@
    limitations under the License.
 */
 
+{% macro bytehouse__reset_csv_table(model, full_refresh, old_relation, agate_table) %}
+  {% if not full_refresh and adapter.is_seed_unchanged(old_relation, model) %}
+    {{ log('Seed ' ~ model['name'] ~ ' is unchanged, skipping reload') }}
+    {{ return('-- unchanged') }}
+  {% endif %}
+  {% if model['config'].get('delta_load', false) %}
+    {% if not full_refresh and adapter.can_load_seed_delta(old_relation, model, agate_table) %}
+      {{ return('-- delta') }}
+    {% endif %}
+    {#- The table does not have the columns of the seed, create it again -#}
+    {% set full_refresh = true %}
+  {% endif %}
+  {{ return(default__reset_csv_table(model, full_refresh, old_relation, agate_table)) }}
+{% endmacro %}
+
 {% macro bytehouse__load_csv_rows(model, agate_table) %}
+  {% if adapter.is_seed_unchanged(this, model) %}
+    {{ return('-- unchanged') }}
+  {% endif %}
   {% set cols_sql = get_seed_column_quoted_csv(model, agate_table.column_names) %}
-  {% set data_sql = adapter.get_csv_data(agate_table) %}
+  {% set column_types = adapter.get_seed_column_types(model, agate_table) %}
 
   {% set sql -%}
-    ByteHouseCustomCSV|insert into {{ this.render() }} ({{ cols_sql }}){{ adapter.get_model_settings(model) }} VALUES{{ data_sql }}
+    insert into {{ this.render() }} ({{ cols_sql }}){{ adapter.get_model_settings(model) }} VALUES
   {%- endset %}
 
-  {% do adapter.add_query(sql, bindings=agate_table, abridge_sql_log=True) %}
+  {%- set passthrough = model['config'].get('csv_passthrough', false) -%}
+  {% if model['config'].get('delta_load', false) %}
+    {% set sql = adapter.load_seed_delta(this, model, agate_table, column_types) %}
+  {% elif not (passthrough and adapter.insert_seed_file(this, model, agate_table, column_types)) %}
+    {% do adapter.insert_seed_columns(
+        sql,
+        agate_table,
+        column_types,
+        batch_size=model['config'].get('batch_size'),
+        workers=model['config'].get('insert_workers', 1),
+        relation=this
+    ) %}
+  {% endif %}
+
+  {% if model['config'].get('skip_unchanged', false) %}
+    {% call statement('seed_fingerprint') %}
+      {{ alter_relation_comment(this, adapter.get_seed_fingerprint(model)) }}
+    {% endcall %}
+  {% endif %}
+  {{ return(sql) }}
 {% endmacro %}
 
 {% macro bytehouse__create_csv_table(model, agate_table) %}
-  {%- set column_override = model['config'].get('column_types', {}) -%}
   {%- set quote_seed_column = model['config'].get('quote_columns', None) -%}
+  {%- set column_types = adapter.get_seed_column_types(model, agate_table) -%}
 
   {% set sql %}
     {% call statement('main') %}
@@ -37,11 +74,12 @@
     {% endcall %}
     create table {{ this.render() }} (
       {%- for col_name in agate_table.column_names -%}
-        {%- set inferred_type = adapter.convert_type(agate_table, loop.index0) -%}
-        {%- set type = column_override.get(col_name, inferred_type) -%}
+        {%- set type = column_types[loop.index0] -%}
         {%- set column_name = (col_name | string) -%}
           {{ adapter.quote_seed_column(column_name, quote_seed_column) }} {{ type }} {%- if not loop.last -%}, {%- endif -%}
       {%- endfor -%}
+      {%- set row_hash_column = adapter.get_seed_row_hash_column(model) -%}
+      {%- if row_hash_column -%}, {{ row_hash_column }}{%- endif -%}
     )
     {{ engine_clause(label='engine') }}
     {{ order_cols(label='order by') }}
@@ -26,7 +26,12 @@
 
 {% macro bytehouse__persist_docs(relation, model, for_relation, for_columns) %}
   {%- if for_relation and config.persist_relation_docs() and model.description -%}
-    {% do run_query(alter_relation_comment(relation, model.description)) %}
+    {%- set comment = model.description -%}
+    {%- if model.resource_type == 'seed' and model.config.get('skip_unchanged', false) -%}
+      {#- Keep the fingerprint used to skip reloading unchanged seeds -#}
+      {%- set comment = comment ~ ' ' ~ adapter.get_seed_fingerprint(model) -%}
+    {%- endif -%}
+    {% do run_query(alter_relation_comment(relation, comment)) %}
   {%- endif -%}
 
   {%- if for_columns and config.persist_column_docs() and model.columns -%}
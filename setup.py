@@ -82,6 +82,9 @@ setup(
         'bytehouse-driver',
         'python-dateutil',
     ],
+    extras_require={
+        'arrow': ['numpy', 'pyarrow'],
+    },
     python_requires=">=3.7",
     platforms='any',
     classifiers=[
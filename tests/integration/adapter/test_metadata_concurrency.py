@@ -0,0 +1,146 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from dbt.adapters.bytehouse.metadata import MetadataCatalog
+from dbt.adapters.bytehouse.nativeclient import BhNativeClient
+
+SCHEMAS = [f'dbt_schema_{idx}' for idx in range(8)]
+TABLES = [f'table_{idx}' for idx in range(5)]
+THREADS = 4
+
+
+class StandInDriver:
+    """
+    Answers the metadata statements of the catalog. Every SHOW TABLES waits until one is in
+    flight for each schema, so listings that do not run concurrently fail the barrier.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._barrier = threading.Barrier(len(SCHEMAS), timeout=10)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def execute(self, sql):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if sql == 'SHOW DATABASES':
+                return [(name, '', '', '', '', '', '', '', 'Cnch') for name in SCHEMAS]
+            if sql.startswith('SHOW TABLES FROM'):
+                self._barrier.wait()
+                return [(name, '', '', '', '', '', '', '', 'TABLE') for name in TABLES]
+            table = sql.split('.')[-1]
+            return [(f'{table}_id', 'Int64', '', '', ''), (f'{table}_name', 'String', '', '', '')]
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def introspect(metadata, driver, schema):
+    tables = sorted(table.name for table in metadata.tables(driver.execute, schema))
+    return {
+        table: [column.name for column in metadata.columns(driver.execute, schema, table)]
+        for table in tables
+    }
+
+
+class TestMetadataConcurrency:
+    def test_concurrent_introspection(self):
+        metadata = MetadataCatalog()
+        driver = StandInDriver()
+        with ThreadPoolExecutor(max_workers=len(SCHEMAS)) as tpe:
+            results = list(tpe.map(lambda schema: introspect(metadata, driver, schema), SCHEMAS))
+        for result in results:
+            assert sorted(result) == TABLES
+            for table, columns in result.items():
+                assert columns == [f'{table}_id', f'{table}_name']
+        assert driver.max_in_flight == len(SCHEMAS)
+
+
+class TestAdapterIntrospectionConcurrency:
+    """
+    Lists and describes relations of several schemas from concurrent threads through the
+    adapter, with the metadata catalog and with the system_meta fallback.
+    """
+
+    @pytest.fixture(scope='class', params=[True, False], ids=['metadata_cache', 'system_meta'])
+    def dbt_profile_target(self, request, dbt_profile_target):
+        return {**dbt_profile_target, 'threads': THREADS, 'metadata_cache': request.param}
+
+    def test_concurrent_adapter_introspection(self, project, monkeypatch):
+        adapter = project.adapter
+        schemas = [f'{project.test_schema}_{idx}' for idx in range(THREADS)]
+        for schema in schemas:
+            project.run_sql(f'create database if not exists {schema}')
+            project.run_sql(
+                f'create table {schema}.tbl (id Int64, name String) engine = MergeTree() order by id'
+            )
+        try:
+            # Load the shared database listing, so each thread only asks for its own schema
+            with adapter.connection_named('__test'):
+                adapter.list_schemas(project.database)
+
+            lock = threading.Lock()
+            barrier = threading.Barrier(THREADS, timeout=60)
+            gated = threading.local()
+            counts = {'in_flight': 0, 'max_in_flight': 0}
+
+            def gate(method):
+                # The first statement of each thread waits until every thread has sent one
+                def wrapper(client, *args, **kwargs):
+                    if getattr(gated, 'passed', False):
+                        return method(client, *args, **kwargs)
+                    gated.passed = True
+                    with lock:
+                        counts['in_flight'] += 1
+                        counts['max_in_flight'] = max(counts['max_in_flight'], counts['in_flight'])
+                    barrier.wait()
+                    try:
+                        return method(client, *args, **kwargs)
+                    finally:
+                        with lock:
+                            counts['in_flight'] -= 1
+
+                return wrapper
+
+            monkeypatch.setattr(BhNativeClient, 'fetch', gate(BhNativeClient.fetch))
+            monkeypatch.setattr(BhNativeClient, 'query', gate(BhNativeClient.query))
+
+            def introspect_schema(schema):
+                with adapter.connection_named(f'introspect_{schema}'):
+                    relation = adapter.Relation.create(schema=schema)
+                    relations = adapter.list_relations_without_caching(relation)
+                    return {
+                        rel.identifier: [c.name for c in adapter.get_columns_in_relation(rel)]
+                        for rel in relations
+                    }
+
+            with ThreadPoolExecutor(max_workers=THREADS) as tpe:
+                results = list(tpe.map(introspect_schema, schemas))
+            assert results == [{'tbl': ['id', 'name']}] * THREADS
+            assert counts['max_in_flight'] == THREADS
+        finally:
+            for schema in schemas:
+                project.run_sql(f'drop database if exists {schema}')
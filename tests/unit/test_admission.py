@@ -0,0 +1,72 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import threading
+import time
+
+from dbt.adapters.bytehouse.admission import WeightedSemaphore, get_admission, is_heavy_statement
+
+
+def test_is_heavy_statement():
+    assert is_heavy_statement('create table db.t engine = Memory() order by id as (select 1)')
+    assert is_heavy_statement('/* {"app": "dbt"} */\n CREATE OR REPLACE TABLE t AS SELECT 1')
+    assert is_heavy_statement('insert into db.t (id)\n  with x as (select 1) select * from x')
+    assert is_heavy_statement('-- comment\nINSERT INTO t SELECT * FROM s')
+    assert is_heavy_statement('alter table t update x = 1 where id = 2')
+    assert is_heavy_statement('alter table t delete where id = 2')
+    assert is_heavy_statement('delete from t where id = 2')
+    assert not is_heavy_statement('insert into t (id, name) values')
+    assert not is_heavy_statement('create table t (id Int32) engine = CnchMergeTree() order by id')
+    assert not is_heavy_statement('create view v as select 1')
+    assert not is_heavy_statement('select count(*) from t')
+    assert not is_heavy_statement('alter table t add column x Int32')
+
+
+def test_weighted_semaphore():
+    semaphore = WeightedSemaphore(2)
+    assert semaphore.acquire(1) < 1
+    # Heavier than the capacity still runs, taking all of it
+    admitted = []
+
+    def heavy():
+        semaphore.acquire(5)
+        admitted.append('heavy')
+
+    def light():
+        semaphore.acquire(1)
+        admitted.append('light')
+
+    threads = [threading.Thread(target=heavy)]
+    threads[0].start()
+    time.sleep(0.05)
+    threads.append(threading.Thread(target=light))
+    threads[1].start()
+    time.sleep(0.05)
+    # A free slot remains, but the light waiter arrived after the heavy one
+    assert admitted == []
+    semaphore.release(1)
+    threads[0].join(1)
+    assert admitted == ['heavy']
+    semaphore.release(5)
+    threads[1].join(1)
+    assert admitted == ['heavy', 'light']
+
+
+def test_get_admission():
+    assert get_admission(('host', 'vw'), 2) is get_admission(('host', 'vw'), 4)
+    assert get_admission(('host', 'vw'), 2) is not get_admission(('host', 'other'), 2)
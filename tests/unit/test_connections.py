@@ -0,0 +1,86 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+from dbt.exceptions import DatabaseException, RuntimeException
+
+from dbt.adapters.bytehouse.connections import ByteHouseConnectionManager
+
+
+def _manager(client):
+    admitted = []
+
+    @contextmanager
+    def admission(sql, conn):
+        admitted.append('enter')
+        try:
+            yield
+        finally:
+            admitted.append('exit')
+
+    @contextmanager
+    def exception_handler(sql):
+        yield
+
+    manager = SimpleNamespace(
+        _add_query_comment=lambda sql: sql,
+        get_thread_connection=lambda: SimpleNamespace(name='model'),
+        _client=lambda conn: client,
+        admission=admission,
+        exception_handler=exception_handler,
+    )
+    return manager, admitted
+
+
+def _stream(manager, **kwargs):
+    return ByteHouseConnectionManager.execute_stream(manager, 'select 1', 1, **kwargs)
+
+
+def test_stream_limit_exceeded_before_first_block():
+    def stream(sql, block_rows, settings=None):
+        raise DatabaseException('Code: 396. Limit for result exceeded, max rows: 1')
+
+    manager, admitted = _manager(SimpleNamespace(stream=stream))
+    with pytest.raises(RuntimeException, match='exceeds the limit of 1 rows'):
+        next(_stream(manager, max_rows=1))
+    assert admitted == ['enter', 'exit']
+
+
+def test_stream_holds_admission_until_closed():
+    closed = []
+
+    def blocks():
+        try:
+            yield [(1,)]
+            yield [(2,)]
+        finally:
+            closed.append(True)
+
+    def stream(sql, block_rows, settings=None):
+        return SimpleNamespace(column_names=['id'], column_types=['Int32'], blocks=blocks())
+
+    manager, admitted = _manager(SimpleNamespace(stream=stream))
+    results = _stream(manager, result_format='columns')
+    assert next(results) == {'id': (1,)}
+    assert admitted == ['enter']
+    results.close()
+    assert admitted == ['enter', 'exit']
+    assert closed == [True]
@@ -0,0 +1,73 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import csv
+import json
+
+from dbt.adapters.bytehouse.costs import (
+    aggregate_costs,
+    query_id_prefix,
+    query_log_sql,
+    write_cost_report,
+)
+
+
+def test_query_log_sql():
+    prefix = query_id_prefix('abc', 'model.proj.orders')
+    assert prefix == 'abc/model.proj.orders/'
+    assert query_id_prefix('abc', None) == 'abc//'
+    sql = query_log_sql('abc', 'system.query_log')
+    assert "startsWith(query_id, 'abc/')" in sql
+    assert 'UserTimeMicroseconds' in sql
+    assert 'NULL FROM system.query_log' in query_log_sql('abc', 'system.query_log', False)
+
+
+def test_aggregate_costs():
+    rows = [
+        ('abc/model.proj.orders/1', 1500, 10, 100, 5, 50, 2000, 3_000_000),
+        ('abc/model.proj.orders/2', 500, 1, 10, 0, 0, 4000, 1_000_000),
+        ('abc/test.proj.not_null/3', 100, 7, 70, 0, 0, 100, None),
+    ]
+    costs = aggregate_costs(rows)
+    assert costs['model.proj.orders'] == {
+        'statements': 2,
+        'elapsed_seconds': 2.0,
+        'cpu_seconds': 4.0,
+        'read_rows': 11,
+        'read_bytes': 110,
+        'written_rows': 5,
+        'written_bytes': 50,
+        'peak_memory': 4000,
+    }
+    assert costs['test.proj.not_null']['cpu_seconds'] is None
+
+
+def test_write_cost_report(tmp_path):
+    costs = aggregate_costs(
+        [
+            ('abc/model.proj.small/1', 100, 1, 1, 0, 0, 1, 1_000),
+            ('abc/model.proj.big/2', 100, 1, 1, 0, 0, 1, 9_000_000),
+        ]
+    )
+    path = write_cost_report(str(tmp_path / 'target'), 'abc', costs)
+    with open(path) as f:
+        assert json.load(f) == {'invocation_id': 'abc', 'nodes': costs}
+    with open(tmp_path / 'target' / 'bytehouse_costs.csv') as f:
+        rows = list(csv.reader(f))
+    assert rows[0][:3] == ['node', 'statements', 'elapsed_seconds']
+    assert [row[0] for row in rows[1:]] == ['model.proj.big', 'model.proj.small']
@@ -0,0 +1,114 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import time
+from types import SimpleNamespace
+
+from dbt.adapters.bytehouse import dbclient
+from dbt.adapters.bytehouse.dbclient import ClientPool, forget_prepared, is_prepared, mark_prepared
+
+
+class FakeClient:
+    def __init__(self):
+        self.healthy = True
+        self.closed = False
+        self.discarded = False
+
+    def is_healthy(self):
+        return self.healthy
+
+    def close(self):
+        self.closed = True
+
+
+def _pool(monkeypatch, max_size=2, idle_timeout=300):
+    monkeypatch.setattr(dbclient, 'get_db_client', lambda credentials: FakeClient())
+    credentials = SimpleNamespace(pool_max_size=max_size, pool_idle_timeout=idle_timeout)
+    return ClientPool(credentials, 1)
+
+
+def test_pool_reuses_released_clients(monkeypatch):
+    pool = _pool(monkeypatch)
+    client = pool.acquire()
+    pool.release(client)
+    assert pool.acquire() is client
+    assert not client.closed
+
+
+def test_pool_discards_unhealthy_clients(monkeypatch):
+    pool = _pool(monkeypatch)
+    client = pool.acquire()
+    pool.release(client)
+    client.healthy = False
+    assert pool.acquire() is not client
+    assert client.closed
+
+
+def test_pool_max_size(monkeypatch):
+    pool = _pool(monkeypatch, max_size=1)
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    pool.release(second)
+    assert not first.closed
+    assert second.closed
+
+
+def test_pool_closes_discarded_clients(monkeypatch):
+    pool = _pool(monkeypatch)
+    client = pool.acquire()
+    client.discarded = True
+    pool.release(client)
+    assert client.closed
+    assert pool.acquire() is not client
+
+
+def test_pool_evicts_idle_clients(monkeypatch):
+    pool = _pool(monkeypatch, idle_timeout=60)
+    client = pool.acquire()
+    pool.release(client)
+    now = time.time()
+    monkeypatch.setattr(dbclient.time, 'time', lambda: now + 61)
+    assert pool.acquire() is not client
+    assert client.closed
+
+
+def test_pool_key_hides_password(monkeypatch):
+    monkeypatch.setattr(dbclient, '_pools', {})
+    values = dict(host='h', port=1, region=None, account=None, user='u', schema='s')
+    credentials = SimpleNamespace(
+        warehouse='w', password='secret', pool_max_size=0, pool_idle_timeout=300, **values
+    )
+    pool = dbclient.get_client_pool(credentials)
+    assert dbclient.get_client_pool(SimpleNamespace(**vars(credentials))) is pool
+    assert (
+        dbclient.get_client_pool(SimpleNamespace(**{**vars(credentials), 'password': 'x'}))
+        is not pool
+    )
+    assert 'secret' not in repr(list(dbclient._pools))
+
+
+def test_prepared_databases():
+    credentials = SimpleNamespace(host='h', port=1, region=None, account='a', user='u')
+    other = SimpleNamespace(host='h', port=1, region=None, account='b', user='u')
+    assert not is_prepared(credentials, 'database', 'analytics')
+    mark_prepared(credentials, 'database', 'analytics')
+    assert is_prepared(credentials, 'database', 'analytics')
+    assert not is_prepared(other, 'database', 'analytics')
+    assert not is_prepared(credentials, 'warehouse', 'analytics')
+    forget_prepared(credentials, 'database', 'analytics')
+    assert not is_prepared(credentials, 'database', 'analytics')
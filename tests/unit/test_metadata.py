@@ -0,0 +1,154 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from dbt.adapters.bytehouse.metadata import (
+    MetadataCatalog,
+    MetadataStore,
+    RelationTypeCache,
+    parse_introspection_scope,
+)
+
+
+def _fetch(calls):
+    def fetch(sql):
+        calls.append(sql)
+        if sql == 'SHOW DATABASES':
+            return [('dbt_db', '', '', '', '', '', '', 'comment', 'Cnch')]
+        if sql.startswith('SHOW TABLES'):
+            return [
+                ('tbl', '', '', '', '', '', '', '', 'TABLE'),
+                ('vw', '', '', '', '', '', '', '', 'VIEW'),
+            ]
+        return [('id', 'Int32', '', '', ''), ('name', 'String', '', '', '')]
+
+    return fetch
+
+
+def test_metadata_loaded_once():
+    calls = []
+    metadata = MetadataCatalog()
+    fetch = _fetch(calls)
+    assert [t.name for t in metadata.tables(fetch, 'dbt_db')] == ['tbl', 'vw']
+    assert [c.name for c in metadata.columns(fetch, 'dbt_db', 'tbl')] == ['id', 'name']
+    metadata.tables(fetch, 'dbt_db')
+    metadata.columns(fetch, 'dbt_db', 'tbl')
+    assert calls == ['SHOW DATABASES', 'SHOW TABLES FROM dbt_db', 'DESCRIBE TABLE dbt_db.tbl']
+    assert metadata.tables(fetch, 'missing') == []
+
+
+def test_metadata_follows_ddl():
+    calls = []
+    metadata = MetadataCatalog()
+    fetch = _fetch(calls)
+    metadata.columns(fetch, 'dbt_db', 'tbl')
+    metadata.observe('/* {"app": "dbt"} */ create table dbt_db.new as select 1', None)
+    metadata.observe('rename table dbt_db.tbl to dbt_db.renamed', None)
+    metadata.observe('drop view if exists vw', 'dbt_db')
+    assert sorted(t.name for t in metadata.tables(fetch, 'dbt_db')) == ['new', 'renamed']
+    assert [c.name for c in metadata.columns(fetch, 'dbt_db', 'renamed')] == ['id', 'name']
+    assert len(calls) == 3
+
+    metadata.observe("alter table dbt_db.renamed modify comment 'new'", None)
+    metadata.tables(fetch, 'dbt_db')
+    assert calls[3:] == ['SHOW TABLES FROM dbt_db']
+
+    metadata.observe('drop database if exists dbt_db', None)
+    assert metadata.tables(fetch, 'dbt_db') == []
+
+
+def test_schema_columns_harvested_in_bulk():
+    calls = []
+    harvested = []
+    metadata = MetadataCatalog()
+    fetch = _fetch(calls)
+    metadata.columns(fetch, 'dbt_db', 'tbl')
+
+    def harvest(tables):
+        harvested.append(tables)
+        return {key: [] for key in tables}
+
+    columns = metadata.schema_columns(fetch, harvest, 'dbt_db')
+    assert [c.name for c in columns['tbl']] == ['id', 'name']
+    assert columns['vw'] == []
+    assert harvested == [[('dbt_db', 'vw')]]
+
+
+def test_parse_introspection_scope():
+    assert parse_introspection_scope('select name from system_meta.databases') == (None, None)
+    assert parse_introspection_scope(
+        "select * from system_meta.tables as t where schema = 'dbt_db'"
+    ) == ({'dbt_db'}, None)
+    assert parse_introspection_scope(
+        "select * from system_meta.columns where table = 'tbl' and database = 'dbt_db'"
+    ) == ({'dbt_db'}, 'tbl')
+    assert parse_introspection_scope(
+        "where database != 'system_meta' and (columns.database = 'a' or columns.database = 'b')"
+    ) == ({'a', 'b'}, None)
+
+
+def test_metadata_store_warms_new_catalog(tmp_path):
+    path = str(tmp_path / 'metadata.db')
+    calls = []
+    metadata = MetadataCatalog()
+    metadata.attach_store(MetadataStore(path, 'account', 300))
+    metadata.columns(_fetch(calls), 'dbt_db', 'tbl')
+
+    warm_calls = []
+    warm = MetadataCatalog()
+    warm.attach_store(MetadataStore(path, 'account', 300))
+    assert [c.name for c in warm.columns(_fetch(warm_calls), 'dbt_db', 'tbl')] == ['id', 'name']
+    assert warm_calls == []
+
+    warm.observe('alter table dbt_db.tbl add column extra Int32', None)
+    cold_calls = []
+    cold = MetadataCatalog()
+    cold.attach_store(MetadataStore(path, 'account', 300))
+    cold.columns(_fetch(cold_calls), 'dbt_db', 'tbl')
+    assert cold_calls == ['SHOW TABLES FROM dbt_db', 'DESCRIBE TABLE dbt_db.tbl']
+
+
+def test_metadata_store_expires(tmp_path):
+    store = MetadataStore(str(tmp_path / 'metadata.db'), 'account', 0)
+    store.put(('databases',), '', [])
+    assert store.get(('databases',)) is None
+
+
+def test_relation_type_cache_follows_ddl():
+    relation_types = RelationTypeCache()
+    assert relation_types.is_view('dbt_db', 'tbl') is None
+    relation_types.remember_listing('dbt_db', {'tbl': False, 'vw': True})
+    assert relation_types.is_view('dbt_db', 'vw') is True
+    assert relation_types.is_view('dbt_db', 'missing') is False
+
+    relation_types.observe('create view dbt_db.new_vw as (select 1)', None)
+    relation_types.observe('rename table dbt_db.vw to dbt_db.old_vw', None)
+    relation_types.observe('drop table if exists tbl', 'dbt_db')
+    assert relation_types.is_view('dbt_db', 'new_vw') is True
+    assert relation_types.is_view('dbt_db', 'old_vw') is True
+    assert relation_types.is_view('dbt_db', 'vw') is False
+    assert relation_types.is_view('dbt_db', 'tbl') is False
+
+    relation_types.observe('rename table other_db.unknown to dbt_db.moved', None)
+    assert relation_types.is_view('dbt_db', 'moved') is None
+
+    # Materialized views are dropped and renamed like tables
+    relation_types.observe('create materialized view dbt_db.mv to dbt_db.tbl as select 1', None)
+    assert relation_types.is_view('dbt_db', 'mv') is False
+    relation_types.remember_listing('other_db', {'listed_vw': None, 'tbl': False})
+    assert relation_types.is_view('other_db', 'listed_vw') is None
+    assert relation_types.is_view('other_db', 'tbl') is False
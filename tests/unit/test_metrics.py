@@ -0,0 +1,106 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import json
+import socket
+
+from dbt.adapters.bytehouse.metrics import (
+    FileSink,
+    Metrics,
+    PrometheusTextfileSink,
+    StatsdSink,
+    create_sink,
+    statement_kind,
+)
+
+
+def test_statement_kind():
+    assert statement_kind('/* {"app": "dbt"} */ create table t (id Int32)') == 'ddl'
+    assert statement_kind('-- comment\n  INSERT INTO t VALUES') == 'insert'
+    assert statement_kind('with x as (select 1) select * from x') == 'select'
+    assert statement_kind('SHOW TABLES FROM db') == 'select'
+    assert statement_kind('set warehouse vw') == 'other'
+    assert statement_kind('') == 'other'
+
+
+def test_metrics_without_sinks():
+    metrics = Metrics()
+    metrics.observe('statement', 1.0, kind='select')
+    assert metrics.snapshot() == ({}, {})
+
+
+def test_file_sink(tmp_path):
+    path = tmp_path / 'target' / 'metrics.jsonl'
+    metrics = Metrics()
+    metrics.add_sink(FileSink(str(path)))
+    with metrics.timed('statement', kind='select'):
+        pass
+    metrics.increment('connection_retries')
+    assert list(metrics.timed_iter('seed_serialization', [1, 2])) == [1, 2]
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record['name'] for record in records] == [
+        'statement',
+        'connection_retries',
+        'seed_serialization',
+        'seed_serialization',
+    ]
+    assert records[0]['labels'] == {'kind': 'select'}
+    assert records[1]['increment'] == 1
+
+
+def test_prometheus_textfile_sink(tmp_path):
+    path = tmp_path / 'metrics.prom'
+    metrics = Metrics()
+    metrics.add_sink(PrometheusTextfileSink(str(path)))
+    metrics.observe('statement', 0.2, kind='select')
+    metrics.observe('statement', 3, kind='select')
+    metrics.observe('handshake', 0.001)
+    metrics.increment('connection_retries')
+    metrics.flush()
+    lines = path.read_text().splitlines()
+    assert '# TYPE dbt_bytehouse_statement_seconds histogram' in lines
+    assert 'dbt_bytehouse_statement_seconds_bucket{kind="select",le="0.1"} 0' in lines
+    assert 'dbt_bytehouse_statement_seconds_bucket{kind="select",le="0.25"} 1' in lines
+    assert 'dbt_bytehouse_statement_seconds_bucket{kind="select",le="+Inf"} 2' in lines
+    assert 'dbt_bytehouse_statement_seconds_count{kind="select"} 2' in lines
+    assert 'dbt_bytehouse_handshake_seconds_bucket{le="0.005"} 1' in lines
+    assert 'dbt_bytehouse_connection_retries_total 1' in lines
+
+
+def test_statsd_sink():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', 0))
+    receiver.settimeout(1)
+    metrics = Metrics()
+    metrics.add_sink(StatsdSink('127.0.0.1', receiver.getsockname()[1]))
+    metrics.observe('statement', 0.5, kind='ddl')
+    metrics.increment('connection_retries')
+    assert receiver.recv(512) == b'dbt_bytehouse.statement.ddl:500.000|ms'
+    assert receiver.recv(512) == b'dbt_bytehouse.connection_retries:1|c'
+    receiver.close()
+
+
+def test_create_sink():
+    assert create_sink('prometheus', 'target').path == 'target/bytehouse_metrics.prom'
+    assert create_sink('file:/tmp/m.jsonl', 'target').path == '/tmp/m.jsonl'
+    assert isinstance(create_sink('statsd:localhost:9125', 'target'), StatsdSink)
+    try:
+        create_sink('graphite', 'target')
+        assert False
+    except ValueError:
+        pass
@@ -0,0 +1,64 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import json
+import pstats
+import sys
+import time
+import tracemalloc
+
+from dbt.adapters.bytehouse.profiling import Profiler, collapse_stack
+
+
+def _busy(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        sum(range(1000))
+
+
+def test_collapse_stack():
+    def inner():
+        return collapse_stack(sys._getframe())
+
+    stack = inner().split(';')
+    assert stack[-1].startswith('inner (test_profiling.py:')
+    assert stack[-2].startswith('test_collapse_stack (test_profiling.py:')
+
+
+def test_profiler(tmp_path):
+    profiler = Profiler(str(tmp_path / 'profiles'), memory=True)
+    with profiler.node('model.proj.orders'):
+        with profiler.node('model.proj.nested'):
+            _busy(0.05)
+        data = [str(idx) * 10 for idx in range(10000)]
+    with profiler.node('model.proj.orders'):
+        _busy(0.02)
+    profiler.write()
+    tracemalloc.stop()
+    assert len(data) == 10000
+    directory = tmp_path / 'profiles'
+    summary = json.loads((directory / 'summary.json').read_text())
+    assert list(summary) == ['model.proj.orders']
+    assert summary['model.proj.orders']['calls'] == 2
+    assert summary['model.proj.orders']['seconds'] >= 0.07
+    assert summary['model.proj.orders']['top_allocations']
+    stats = pstats.Stats(str(directory / 'model.proj.orders.prof'))
+    assert any(func[2] == '_busy' for func in stats.stats)
+    stacks = (directory / 'collapsed_stacks.txt').read_text().splitlines()
+    assert stacks and all(line.startswith('model.proj.orders;') for line in stacks)
+    assert any('_busy (test_profiling.py:' in line for line in stacks)
@@ -0,0 +1,82 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import datetime
+from decimal import Decimal
+
+import pytest
+
+from dbt.adapters.bytehouse.results import column_kind, columns_to_result, table_from_result
+
+
+def test_column_kind():
+    assert column_kind('UInt64') == 'number'
+    assert column_kind('Nullable(Decimal(10, 2))') == 'number'
+    assert column_kind('LowCardinality(Nullable(String))') == 'text'
+    assert column_kind('Date32') == 'date'
+    assert column_kind("DateTime64(3, 'UTC')") == 'datetime'
+    assert column_kind('Bool') == 'boolean'
+    assert column_kind('Array(Int32)') == 'json'
+    assert column_kind('UUID') == 'text'
+
+
+def test_table_from_result():
+    rows = [
+        (1, '005', datetime.date(2023, 1, 2), [1, 2], None),
+        (2, '', datetime.date(2023, 1, 3), [], 'null'),
+    ]
+    table = table_from_result(
+        rows,
+        ['id', 'code', 'day', 'items', 'note'],
+        ['UInt8', 'String', 'Date', 'Array(UInt8)', 'Nullable(String)'],
+    )
+    assert table.column_names == ('id', 'code', 'day', 'items', 'note')
+    assert table.rows[0]['id'] == Decimal(1)
+    assert table.columns['code'].values() == ('005', '')
+    assert table.columns['day'].values() == (datetime.date(2023, 1, 2), datetime.date(2023, 1, 3))
+    assert table.columns['items'].values() == ('[1, 2]', '[]')
+    assert table.columns['note'].values() == (None, 'null')
+
+
+def test_columns_to_result():
+    columns = [(1, 2), ('a', None)]
+    result = columns_to_result(columns, ['id', 'name'], ['UInt8', 'Nullable(String)'], 'columns')
+    assert result == {'id': (1, 2), 'name': ('a', None)}
+    assert columns_to_result([], ['id'], ['UInt8'], 'columns') == {'id': []}
+    with pytest.raises(ValueError):
+        columns_to_result(columns, ['id', 'name'], ['UInt8', 'String'], 'pandas')
+
+
+def test_columns_to_numpy():
+    numpy = pytest.importorskip('numpy')
+    columns = [(1, 2), (1, None), ([1], [2, 3])]
+    types = ['UInt8', 'Nullable(Int32)', 'Array(UInt8)']
+    result = columns_to_result(columns, ['a', 'b', 'c'], types, 'numpy')
+    assert result['a'].dtype == numpy.uint8
+    assert result['b'].dtype == object
+    assert list(result['c']) == [[1], [2, 3]]
+
+
+def test_columns_to_arrow():
+    pyarrow = pytest.importorskip('pyarrow')
+    columns = [(1, 2), ('a', None), (Decimal('1.50'), Decimal('2.25'))]
+    types = ['UInt8', 'Nullable(String)', 'Decimal(10, 2)']
+    table = columns_to_result(columns, ['a', 'b', 'c'], types, 'arrow')
+    assert table.schema.field('a').type == pyarrow.uint8()
+    assert table.column('b').null_count == 1
+    assert table.schema.field('c').type == pyarrow.decimal128(10, 2)
@@ -0,0 +1,120 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from types import SimpleNamespace
+
+import agate
+
+from dbt.adapters.bytehouse.impl import ByteHouseAdapter
+from dbt.adapters.bytehouse.relation import ByteHouseRelation
+from dbt.adapters.bytehouse.seeds import row_hashes
+
+
+def _seed(*names):
+    return agate.Table([[name] for name in names], ['name'], [agate.Text()])
+
+
+class FakeConnections:
+    def __init__(self, stored, affected, staged):
+        self.results = {
+            'select _dbt_row_hash from db.seed': stored,
+            'select distinct _partition_id from db.seed where': affected,
+            'select distinct _partition_id from db.seed__dbt_delta': staged,
+        }
+        self.inserted = []
+
+    def fetch_rows(self, sql):
+        for prefix, rows in self.results.items():
+            if sql.startswith(prefix):
+                return [(value,) for value in rows]
+        raise AssertionError(f'Unexpected query {sql}')
+
+    def insert_column_chunks(self, sql, chunks, workers):
+        self.inserted.append((sql, list(chunks)))
+
+
+def _adapter(connections):
+    executed = []
+    adapter = SimpleNamespace(
+        connections=connections,
+        execute=executed.append,
+        quote_seed_column=lambda name, quote_config: name,
+        get_model_settings=lambda model: '',
+    )
+    return adapter, executed
+
+
+def _load(adapter, table):
+    relation = ByteHouseRelation.create(schema='db', identifier='seed')
+    model = {'name': 'seed', 'config': {}}
+    return ByteHouseAdapter.load_seed_delta(adapter, relation, model, table, ['String'])
+
+
+def test_load_seed_delta_rebuilds_affected_partitions():
+    kept_a, kept_b, _ = row_hashes(_seed('a', 'b', 'c'))
+    changed_x, changed_y = row_hashes(_seed('x', 'y'))
+    # x shares p1 with rows that stay, y is alone in p2, the new row c lands in p3
+    connections = FakeConnections(
+        [kept_a, kept_b, changed_x, changed_y], ['p1', 'p2'], ['p1', 'p3']
+    )
+    adapter, executed = _adapter(connections)
+    _load(adapter, _seed('a', 'b', 'c'))
+    assert connections.inserted == [
+        (
+            'insert into db.seed__dbt_delta (name, _dbt_row_hash) VALUES',
+            [[['c'], [row_hashes(_seed('c'))[0]]]],
+        )
+    ]
+    assert executed == [
+        'drop table if exists db.seed__dbt_delta',
+        'create table db.seed__dbt_delta as db.seed',
+        "insert into db.seed__dbt_delta select * from db.seed where _partition_id in ('p1', 'p2') "
+        f'and _dbt_row_hash not in ({changed_x}, {changed_y})',
+        "alter table db.seed replace partition id 'p1' from db.seed__dbt_delta",
+        "alter table db.seed drop partition id 'p2'",
+        "insert into db.seed select * from db.seed__dbt_delta where _partition_id not in ('p1', 'p2')",
+        'drop table if exists db.seed__dbt_delta',
+    ]
+
+
+def test_load_seed_delta_inserts_new_rows_only():
+    connections = FakeConnections(row_hashes(_seed('a')), [], [])
+    adapter, executed = _adapter(connections)
+    _load(adapter, _seed('a', 'b'))
+    assert [sql for sql, _ in connections.inserted] == [
+        'insert into db.seed (name, _dbt_row_hash) VALUES'
+    ]
+    assert executed == []
+
+
+def test_can_load_seed_delta_compares_nullability():
+    table = _seed('a', None)
+    relation = ByteHouseRelation.create(schema='db', identifier='seed')
+    model = {'config': {'delta_load': True}}
+
+    def adapter(existing_type):
+        columns = [('name', existing_type), ('_dbt_row_hash', 'UInt64')]
+        return SimpleNamespace(
+            get_seed_column_types=lambda model, agate_table: ['Nullable(String)'],
+            get_columns_in_relation=lambda relation: [
+                SimpleNamespace(name=name, dtype=dtype) for name, dtype in columns
+            ],
+        )
+
+    assert ByteHouseAdapter.can_load_seed_delta(adapter('Nullable(String)'), relation, model, table)
+    assert not ByteHouseAdapter.can_load_seed_delta(adapter('String'), relation, model, table)
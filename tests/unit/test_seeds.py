@@ -0,0 +1,227 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import datetime
+from decimal import Decimal
+
+from dbt.adapters.bytehouse.seeds import (
+    batch_rows,
+    column_converter,
+    diff_row_hashes,
+    infer_seed_types,
+    iter_csv_chunks,
+    iter_delta_chunks,
+    iter_seed_chunks,
+    needs_client_conversion,
+    quote_string,
+    row_hashes,
+    seed_columns,
+    seed_fingerprint,
+    unwrap_type,
+)
+
+
+class Boolean:
+    pass
+
+
+class Text:
+    pass
+
+
+class Number:
+    pass
+
+
+class Date:
+    pass
+
+
+class DateTime:
+    pass
+
+
+class _Column:
+    def __init__(self, values, data_type=None):
+        self._values = values
+        self.data_type = data_type or Text()
+
+    def values(self):
+        return self._values
+
+
+class _Table:
+    def __init__(self, *columns):
+        self.columns = [_Column(values) for values in columns]
+        self.rows = list(zip(*columns))
+
+
+def test_unwrap_type():
+    assert unwrap_type('Int32') == ('Int32', False)
+    assert unwrap_type('Nullable(Int32)') == ('Int32', True)
+    assert unwrap_type('LowCardinality(Nullable(String))') == ('String', True)
+
+
+def test_column_converter():
+    assert column_converter('Int32')(Decimal('3')) == 3
+    assert column_converter('Int32')(True) == 1
+    assert column_converter('Int32')(None) == 0
+    assert column_converter('Nullable(Int64)')(None) is None
+    assert column_converter('Float32')(Decimal('1.5')) == 1.5
+    assert column_converter('Decimal(10, 2)')(Decimal('1.25')) == Decimal('1.25')
+    assert column_converter('String')(None) == ''
+    assert column_converter('String')('a|b') == 'a|b'
+    assert column_converter('Date')(datetime.datetime(2023, 1, 2, 3)) == datetime.date(2023, 1, 2)
+    assert column_converter('DateTime')(datetime.date(2023, 1, 2)) == datetime.datetime(2023, 1, 2)
+
+
+def test_seed_columns():
+    table = _Table((Decimal('1'), Decimal('2')), ('x', None))
+    assert seed_columns(table, ['Int32', 'Nullable(String)']) == [[1, 2], ['x', None]]
+
+
+def test_batch_rows():
+    table = _Table(tuple('x' * 9 for _ in range(10)))
+    assert batch_rows(None, table) is None
+    assert batch_rows(3, table) == 3
+    assert batch_rows('1KB', table) == 102
+    try:
+        batch_rows('lots', table)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_iter_seed_chunks():
+    table = _Table(tuple(Decimal(idx) for idx in range(5)), tuple(str(idx) for idx in range(5)))
+    chunks = list(iter_seed_chunks(table, ['Int32', 'String'], 2))
+    assert chunks == [[[0, 1], ['0', '1']], [[2, 3], ['2', '3']], [[4], ['4']]]
+
+
+def test_iter_csv_chunks(tmp_path):
+    path = tmp_path / 'seed.csv'
+    path.write_bytes(b'id,name\n1,a\n2,"multi\nline"\n3,c\n')
+    chunks = list(iter_csv_chunks(str(path), 8))
+    assert ''.join(chunks) == '1,a\n2,"multi\nline"\n3,c\n'
+    assert all(chunk.count('"') % 2 == 0 for chunk in chunks)
+    assert chunks[0] == '1,a\n'
+
+
+def test_needs_client_conversion():
+    table = _Table((True, False))
+    table.columns[0].data_type = Boolean()
+    assert needs_client_conversion(table, ['Int32'])
+    assert not needs_client_conversion(table, ['Bool'])
+    assert not needs_client_conversion(_Table(('a',)), ['String'])
+
+
+def test_needs_client_conversion_null_tokens(tmp_path):
+    path = tmp_path / 'seed.csv'
+    path.write_text('id,name\n1,\n2,a\n')
+    table = _Table((Decimal(1), Decimal(2)), (None, 'a'))
+    assert not needs_client_conversion(table, ['Int32', 'String'], str(path))
+    path.write_text('id,name\n1, N/A \n2,a\n')
+    assert needs_client_conversion(table, ['Int32', 'String'], str(path))
+    assert not needs_client_conversion(table, ['Int32', 'String'])
+
+
+def test_quote_string():
+    assert quote_string("it's a \\ test") == "'it\\'s a \\\\ test'"
+
+
+def test_infer_seed_types():
+    rows = 100
+    table = _Table(
+        tuple(Decimal(idx) for idx in range(rows)),
+        tuple(Decimal(-idx * 1000) for idx in range(rows)),
+        tuple(Decimal(idx) / 100 for idx in range(rows)),
+        tuple(None if idx % 2 else Decimal(2**40) for idx in range(rows)),
+        tuple(['red', 'green', None, 'blue'][idx % 4] for idx in range(rows)),
+        tuple(f'unique_{idx}' for idx in range(rows)),
+        tuple(datetime.date(2023, 1, 1) for _ in range(rows)),
+        tuple(datetime.datetime(2023, 1, 1, 0, 0, 0, idx) for idx in range(rows)),
+        tuple(idx % 2 == 0 for idx in range(rows)),
+    )
+    for column, data_type in zip(
+        table.columns,
+        [Number, Number, Number, Number, Text, Text, Date, DateTime, Boolean],
+    ):
+        column.data_type = data_type()
+    inferred = infer_seed_types(table)
+    assert [column.type for column in inferred] == [
+        'UInt8',
+        'Int32',
+        'Decimal(3, 2)',
+        'Nullable(UInt64)',
+        'LowCardinality(Nullable(String))',
+        'String',
+        'Date',
+        'DateTime64(3)',
+        'UInt8',
+    ]
+    assert inferred[0].raw_bytes == rows
+    assert all(0 < column.compressed_bytes <= column.raw_bytes * 2 for column in inferred)
+
+
+def test_infer_seed_types_not_finite():
+    table = _Table(
+        (Decimal(1), Decimal('NaN')),
+        (Decimal('1.5'), Decimal('-Infinity')),
+        (Decimal('Infinity'), None),
+    )
+    for column in table.columns:
+        column.data_type = Number()
+    inferred = infer_seed_types(table)
+    assert [column.type for column in inferred] == ['Float64', 'Float64', 'Nullable(Float64)']
+
+
+def test_seed_fingerprint(tmp_path):
+    path = tmp_path / 'seed.csv'
+    path.write_text('id,name\n1,a\n')
+    config = {'column_types': {'id': 'UInt8'}, 'tags': []}
+    fingerprint = seed_fingerprint(str(path), config)
+    assert fingerprint.startswith('dbt-seed-fingerprint:')
+    assert seed_fingerprint(str(path), dict(config, tags=['daily'])) == fingerprint
+    assert seed_fingerprint(str(path), dict(config, column_types={})) != fingerprint
+    assert seed_fingerprint(str(path), dict(config, delta_load=True)) != fingerprint
+    path.write_text('id,name\n1,b\n')
+    assert seed_fingerprint(str(path), config) != fingerprint
+
+
+def test_row_hashes():
+    table = _Table(('a', 'b', 'a', None), (Decimal('1'), Decimal('1'), Decimal('1'), Decimal('1')))
+    hashes = row_hashes(table)
+    assert hashes[0] == hashes[2]
+    assert len(set(hashes)) == 3
+    assert all(0 <= row_hash < 2**64 for row_hash in hashes)
+    assert row_hashes(_Table(('a',), (Decimal('1'),))) == hashes[:1]
+
+
+def test_diff_row_hashes():
+    assert diff_row_hashes([1, 2, 3], [1, 2, 3]) == ([], [])
+    assert diff_row_hashes([1, 2, 3, 4], [1, 2]) == ([2, 3], [])
+    assert diff_row_hashes([1, 3], [1, 2]) == ([1], [2])
+    # One copy of a duplicated row was deleted, the remaining copy is inserted again
+    assert diff_row_hashes([1, 5], [1, 5, 5]) == ([1], [5])
+    assert diff_row_hashes([5, 5, 5], [5]) == ([0, 1], [])
+
+
+def test_iter_delta_chunks():
+    table = _Table(tuple(Decimal(idx) for idx in range(5)), tuple(str(idx) for idx in range(5)))
+    chunks = list(iter_delta_chunks(table, ['Int32', 'String'], [1, 3, 4], [10, 11, 12, 13, 14], 2))
+    assert chunks == [[[1, 3], ['1', '3'], [11, 13]], [[4], ['4'], [14]]]
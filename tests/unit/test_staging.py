@@ -0,0 +1,133 @@
+"""
+   Copyright 2016-2022 ClickHouse, Inc.
+
+   Copyright 2022- 2023 Bytedance Ltd. and/or its affiliates
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from types import SimpleNamespace
+
+import agate
+import bytehouse_driver
+import pytest
+from dbt.exceptions import DatabaseException
+
+from dbt.adapters.bytehouse.impl import ByteHouseAdapter
+from dbt.adapters.bytehouse.metadata import RelationTypeCache
+from dbt.adapters.bytehouse.nativeclient import BhNativeClient
+from dbt.adapters.bytehouse.relation import ByteHouseRelation
+
+# Prepended by dbt to every statement
+QUERY_COMMENT = '/* {"app": "dbt", "node_id": "seed.test.seed"} */\n'
+
+
+class FakeDriver:
+    def __init__(self, views=(), fail=None):
+        self.statements = []
+        self._views = views
+        self._fail = fail
+
+    def execute(self, sql, *args, **kwargs):
+        self.statements.append(sql)
+        if self._fail and self._fail in sql:
+            raise bytehouse_driver.errors.Error(f'{self._fail} failed')
+        if sql.startswith('SHOW TABLES FROM'):
+            return [(name,) + ('',) * 7 + ('VIEW',) for name in self._views]
+        return []
+
+
+def _client(driver):
+    client = BhNativeClient.__new__(BhNativeClient)
+    client._client = driver
+    client._system_meta = None
+    client._helpers = []
+    client.query_id = None
+    client.query_id_prefix = ''
+    client.database = 'db'
+    client.metadata = None
+    client.relation_types = RelationTypeCache()
+    return client
+
+
+def _adapter(client):
+    return SimpleNamespace(
+        execute=lambda sql: client.command(QUERY_COMMENT + sql),
+        can_exchange=lambda schema, rel_type: False,
+    )
+
+
+def _swap(driver, load):
+    relation = ByteHouseRelation.create(schema='db', identifier='seed')
+    adapter = _adapter(_client(driver))
+    return ByteHouseAdapter._load_through_staging(adapter, relation, load)
+
+
+def _statements(driver):
+    return [sql for sql in driver.statements if not sql.startswith('SHOW')]
+
+
+def test_staging_swap():
+    driver = FakeDriver()
+    assert _swap(driver, lambda staging: True)
+    statements = _statements(driver)
+    assert statements[-2] == f'{QUERY_COMMENT}drop table if exists db.seed'
+    assert statements[-1] == 'rename table db.seed__dbt_seed to db.seed'
+
+
+def test_staging_dropped_when_not_loaded():
+    driver = FakeDriver()
+    assert not _swap(driver, lambda staging: False)
+    statements = _statements(driver)
+    assert statements[-1] == f'{QUERY_COMMENT}drop table if exists db.seed__dbt_seed'
+    assert not any(sql.endswith('drop table if exists db.seed') for sql in statements)
+
+
+def test_staging_kept_when_rename_fails():
+    driver = FakeDriver(fail='rename table')
+    with pytest.raises(DatabaseException):
+        _swap(driver, lambda staging: True)
+    statements = _statements(driver)
+    assert statements[-1] == 'rename table db.seed__dbt_seed to db.seed'
+
+
+def test_chunked_seed_loaded_through_staging():
+    driver = FakeDriver()
+    inserted = []
+    connections = SimpleNamespace(
+        insert_column_chunks=lambda sql, chunks, workers: inserted.append((sql, list(chunks)))
+    )
+    adapter = _adapter(_client(driver))
+    adapter.connections = connections
+    adapter._load_through_staging = lambda relation, load: ByteHouseAdapter._load_through_staging(
+        adapter, relation, load
+    )
+    relation = ByteHouseRelation.create(schema='db', identifier='seed')
+    table = agate.Table([[1], [2], [3]], ['id'], [agate.Number()])
+    sql = 'insert into db.seed (id) VALUES'
+    ByteHouseAdapter.insert_seed_columns(
+        adapter, sql, table, ['Int32'], batch_size=2, relation=relation
+    )
+    assert inserted == [('insert into db.seed__dbt_seed (id) VALUES', [[[1, 2]], [[3]]])]
+    assert _statements(driver)[-1] == 'rename table db.seed__dbt_seed to db.seed'
+
+
+def test_drop_table_rewritten_for_views():
+    driver = FakeDriver(views=('v',))
+    client = _client(driver)
+    client.command(f'{QUERY_COMMENT}drop table db.v')
+    client.command(f'{QUERY_COMMENT}drop table if exists db.t')
+    assert _statements(driver) == [
+        f'{QUERY_COMMENT}drop view db.v',
+        f'{QUERY_COMMENT}drop table if exists db.t',
+    ]